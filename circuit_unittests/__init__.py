@@ -0,0 +1,21 @@
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+"""
+"Unit tests" for KiCad schematics and PCBs.
+
+ * schematic - Schematic / Part / Component / Net model,
+ * netlist - building a Schematic from a netlist (.xml) or schematic (.sch),
+ * connectivity - nets joined through passives collapsed together,
+ * constraints - FPGA pin constraints and the UCF / XDC / PCF / JSON writers,
+ * checks, ddr3 - schematic checks,
+ * snapshot - mmap-able connectivity cache,
+ * outofcore - bounded memory constraints for very large netlists,
+ * pcb - PCB coupling and spacing checks,
+ * cli - the circuit-unittests command.
+
+Only the model is imported here, the rest are imported when used (so opening
+a snapshot doesn't import the constraints).
+"""
+
+from .schematic import Pin, Part, Component, Connection, Net, Pull, Schematic, Fields
+from .connectivity import build_connectivity
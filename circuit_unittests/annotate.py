@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+"""
+Annotates every component pin with what it is connected to, through the
+passives, straight from a kicad_netlist_reader netlist.
+
+annotations() yields a PinAnnotation for each pin as it is worked out, which
+write_jsonl() writes out as JSON Lines (one object per pin) in large chunks,
+so the report for a large board is never all in memory.
+"""
+
+import json
+
+from collections import namedtuple
+
+from .constraints import write_lines
+
+
+def getpins(comp):
+    pins = []
+    for node in comp.getLibPart().element.getChild('pins').getChildren():
+        pin = node.attributes['num']
+        try:
+            pin = int(pin)
+        except ValueError:
+            pass
+
+        pins.append(pin)
+    # Numbers before names, as Python 2 sorted them.
+    pins.sort(key=lambda pin: (not isinstance(pin, int), pin))
+    return pins
+
+
+def power_type(netname):
+    if "VCC" in netname:
+        return "VCC"
+    if "GND" in netname:
+        return "GND"
+    return None
+
+
+Pull = namedtuple('Pull', ['net', 'by', 'to', 'type'])
+Connection = namedtuple('Connection', ['by', 'to'])
+
+
+class NC(object):
+    pass
+
+
+Connected = namedtuple("Connected", ['net', 'component', 'pin'])
+ConnectedVia = namedtuple("ConnectedVia", ['net', 'component', 'path'])
+
+# net is None (and the rest empty) for pins which aren't connected. via is the
+# (by, from net, to net) passives joining the nets the pin is connected to.
+PinAnnotation = namedtuple("PinAnnotation", ['component', 'pin', 'net', 'connected', 'pulls', 'via'])
+
+
+def annotations(netfile):
+    """Generates a PinAnnotation for each pin of the (non passive) components,
+    in component then pin order."""
+    nets = {}
+    for node in netfile.nets:
+        netname = node.attributes['name']
+        assert netname not in nets
+        nets[netname] = node
+
+    # ---------------------------------
+    # Associate nets with components
+    # ---------------------------------
+
+    components_nets = {}
+    for netname, node in nets.items():
+        for child in node.getChildren():
+            comp_ref = child.attributes['ref']
+
+            comp_pin = child.attributes['pin']
+            try:
+                comp_pin = int(comp_pin)
+            except ValueError:
+                pass
+
+            component_pins = components_nets.setdefault(comp_ref, {})
+            if comp_pin in component_pins:
+                assert netname == component_pins[comp_pin], "%s %s %s" % (comp_pin, component_pins[comp_pin], netname)
+            else:
+                component_pins[comp_pin] = netname
+
+    # ---------------------------------
+    # Sort the components into types
+    # ---------------------------------
+
+    # Find the FPGA component
+    passives = {}
+    components = {}
+    fpga = None
+    for component in netfile.getInterestingComponents():
+        if component.getPartName().startswith('XC6SLX'):
+            if fpga:
+                raise IOError("Duplicate FPGA found.")
+            fpga = component
+        elif component.getPartName() in ('R', 'C'): #, 'RES_NET4'):
+            assert len(getpins(component)) == 2
+            passives[component.getRef()] = component
+        else:
+            components[component.getRef()] = component
+
+    if not fpga:
+        raise IOError("FPGA part not found")
+
+    # ---------------------------------
+    # Work out connections through passive components
+    # ---------------------------------
+
+    connected_nets = {}
+    pulled = {}
+    for netname, node in nets.items():
+        if power_type(netname):
+            continue
+
+        # Work out the passives connected to this net and the other nets these
+        # passives are connected too.
+        net_passives = {}
+        for node in node.getChildren():
+            ref = node.attributes['ref']
+            if ref not in passives:
+                continue
+            net_passives[ref] = set(components_nets[ref].values())
+
+        if not net_passives:
+            continue
+
+        # Work out if these are connected to a power plane or another signal net.
+        for ref, all_nets in net_passives.items():
+            # Exclude the current net
+            other_nets = all_nets - set([netname])
+            assert netname not in other_nets
+
+            # Passives connected to power nets should only have one other
+            # connection.
+            if len(other_nets) == 1:
+                other_net = list(other_nets)[0]
+                pulltype = power_type(other_net)
+                if pulltype:
+                    pulled.setdefault(netname, set()).add(Pull(net=netname, by=ref, to=other_net, type=pulltype))
+                    continue
+
+            for other_net in other_nets:
+                assert not power_type(other_net)
+                assert netname != other_net
+                connected_nets.setdefault(netname, set()).add(Connection(by=ref, to=other_net))
+
+    # Reduce the connected nets
+    def full_path(path):
+        last_net = path[-1]
+
+        for connection in connected_nets.get(last_net, []):
+            if connection.to in path:
+                continue
+
+            path.append(connection.to)
+            full_path(path)
+
+    full_connections = set()
+    for net in connected_nets:
+        path = []
+        path.append(net)
+        full_path(path)
+        path.sort()
+        full_connections.add(tuple(path))
+
+    connections = {}
+    for connection in full_connections:
+        for netname in connection:
+            connections[netname] = connection
+
+    # ---------------------------------
+
+    for comp_ref in sorted(components):
+        comp_nets = components_nets[comp_ref]
+
+        for pin in getpins(components[comp_ref]):
+            if pin not in comp_nets:
+                yield PinAnnotation(comp_ref, pin, None, (), (), ())
+                continue
+
+            pin_netname = comp_nets[pin]
+            pin_nets = [pin_netname]
+            if pin_netname in connections:
+                pin_nets = connections[pin_netname]
+
+            pin_connections = set()
+            pin_pulls = set()
+            pin_via = set()
+            for net in pin_nets:
+                net_node = nets[net]
+                for child in net_node.getChildren():
+                    pin_connections.add(Connected(net=net, component=child.attributes['ref'], pin=child.attributes['pin']))
+                pin_pulls.update(pulled.get(net, ()))
+                for connection in connected_nets.get(net, ()):
+                    if net < connection.to:
+                        pin_via.add((connection.by, net, connection.to))
+
+            assert pin_connections, pin_nets
+            yield PinAnnotation(
+                comp_ref, pin, pin_netname,
+                tuple(sorted(pin_connections)), tuple(sorted(pin_pulls)), tuple(sorted(pin_via)))
+
+
+def annotate(netfile):
+    """{component ref: {pin: NC() or set of Connected}} for the netlist."""
+    component_annotated = {}
+    for a in annotations(netfile):
+        annotated = component_annotated.setdefault(a.component, {})
+        assert a.pin not in annotated
+        if a.net is None:
+            annotated[a.pin] = NC()
+        else:
+            annotated[a.pin] = set(a.connected)
+    return component_annotated
+
+
+def _record(a):
+    return {
+        'component': a.component,
+        # As a string, like the pins of the connected components.
+        'pin': u'%s' % (a.pin,),
+        'net': a.net,
+        'nc': a.net is None,
+        'connected': [c._asdict() for c in a.connected],
+        'pulls': [p._asdict() for p in a.pulls],
+        'via': [{'by': by, 'from': from_net, 'to': to_net} for by, from_net, to_net in a.via],
+    }
+
+
+def write_jsonl(annotations, out, chunk_size=4096):
+    """Write the annotations as JSON Lines, chunk_size lines at a time."""
+    write_lines(
+        (json.dumps(_record(a), sort_keys=True) + "\n" for a in annotations), out, chunk_size)
@@ -0,0 +1,499 @@
+#!/usr/bin/env python
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+"""
+Schematic checks, with their results cached on the part of the schematic they
+read.
+
+A check is a function registered with @check, which is given the schematic
+(through a proxy which records every part, component, net and pin map it
+reads) and yields problem strings. Checks which name parts are run once for
+each component using one of those parts.
+
+The cache entry for a check is keyed by a hash of the check's code and a
+hash of the content of everything it read on the last run. The code hash
+covers the functions, classes and constants the check uses (found from the
+names in its code) and the schematic module whose objects it is given. If none of that
+changed the stored problems are reused, so a revision which doesn't touch the
+HDMI section doesn't rerun the HDMI checks. The least recently used entries
+are removed once the cache holds more than max_entries.
+"""
+
+import hashlib
+import inspect
+import marshal
+import os
+import re
+import sys
+import tempfile
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+from collections import namedtuple
+
+from . import schematic as _schematic_module
+from .constraints import pin_str
+
+
+# Bump when the cache entries or the hashing change.
+CACHE_VERSION = 2
+
+Check = namedtuple("Check", ['name', 'func', 'parts', 'collapsed'])
+
+CHECKS = []
+
+
+def check(name, parts=None, collapsed=False):
+    """Register a check.
+
+    parts -- run the check for each component using one of these parts, as
+             func(schematic, component), instead of once as func(schematic).
+    collapsed -- the check needs the connectivity (nets joined through the
+                 passives) rather than the schematic.
+    """
+    def register(func):
+        CHECKS.append(Check(name, func, tuple(parts) if parts else None, collapsed))
+        return func
+    return register
+
+
+# ---------------------------------
+# Tracing
+# ---------------------------------
+
+class _TracedMapping(Mapping):
+    """Mapping which records the keys read, iterating records (kind, None)."""
+
+    def __init__(self, kind, data, reads):
+        self._kind = kind
+        self._data = data
+        self._reads = reads
+
+    def __getitem__(self, key):
+        self._reads.add((self._kind, key))
+        return self._data[key]
+
+    def __contains__(self, key):
+        self._reads.add((self._kind, key))
+        return key in self._data
+
+    def __iter__(self):
+        self._reads.add((self._kind, None))
+        return iter(self._data)
+
+    def __len__(self):
+        self._reads.add((self._kind, None))
+        return len(self._data)
+
+
+class TracingSchematic(object):
+    """Read only view of a schematic which records what is read in reads."""
+
+    def __init__(self, schematic):
+        self.reads = set()
+        self._schematic = schematic
+        self.parts = _TracedMapping('parts', schematic.parts, self.reads)
+        self.components = _TracedMapping('components', schematic.components, self.reads)
+        self.nets = _TracedMapping('nets', schematic.nets, self.reads)
+        self.components2nets = _TracedMapping('components2nets', schematic.components2nets, self.reads)
+
+    def net_for_pin(self, component, pin):
+        assert pin
+        netname = self.components2nets[component.name][pin]
+        return self.nets[netname]
+
+    def get_fpga(self):
+        self.reads.add(('fpga', None))
+        return self._schematic.get_fpga()
+
+
+def _canonical(value):
+    """Value with sets and mappings replaced by sorted tuples, so its repr is
+    the same for the same content."""
+    if isinstance(value, (set, frozenset)):
+        return ('set',) + tuple(sorted((_canonical(v) for v in value), key=repr))
+    elif isinstance(value, (Mapping, dict)):
+        return ('map',) + tuple(sorted(((k, _canonical(v)) for k, v in value.items()), key=repr))
+    elif isinstance(value, (tuple, list)):
+        return tuple(_canonical(v) for v in value)
+    return value
+
+
+def _content(schematic, kind, key):
+    if kind == 'fpga':
+        return schematic.get_fpga()
+    mapping = getattr(schematic, kind)
+    if key is None:
+        return tuple(sorted(mapping, key=repr))
+    try:
+        return _canonical(mapping[key])
+    except KeyError:
+        return None
+
+
+def subgraph_hash(schematic, reads):
+    """Hash of the content of the reads (as recorded by TracingSchematic)."""
+    h = hashlib.sha1()
+    for kind, key in sorted(reads, key=repr):
+        h.update(repr((kind, key, _content(schematic, kind, key))).encode('utf-8'))
+    return h.hexdigest()
+
+
+def _source(obj):
+    try:
+        return inspect.getsource(obj).encode('utf-8')
+    except (IOError, TypeError):
+        if inspect.isfunction(obj):
+            return marshal.dumps(obj.__code__)
+        return repr(obj).encode('utf-8')
+
+
+def _names(code):
+    """Global names used by the code, including by nested functions,
+    generator expressions and lambdas."""
+    names = list(code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            names.extend(_names(const))
+    return names
+
+
+def _constant(value):
+    if hasattr(value, 'pattern') and hasattr(value, 'flags'):
+        return repr(('re', value.pattern, value.flags))
+    return repr(_canonical(value))
+
+
+def _ours(value):
+    name = value.__name__ if inspect.ismodule(value) else getattr(value, '__module__', None)
+    return (name or '').split('.')[0] == __name__.split('.')[0]
+
+
+def _dependencies(func, found):
+    """Fill found ({name: bytes}) with the source of the functions, classes
+    and modules of this package func uses, and the repr of the constants,
+    recursively. Anything from outside the package is only named."""
+    for name in _names(func.__code__):
+        if name in found or name not in func.__globals__:
+            continue
+        value = func.__globals__[name]
+        if inspect.isfunction(value) or inspect.isclass(value) or inspect.ismodule(value):
+            if not _ours(value):
+                found[name] = repr(getattr(value, '__name__', name)).encode('utf-8')
+                continue
+            found[name] = _source(value)
+            if inspect.isfunction(value):
+                _dependencies(value, found)
+        else:
+            found[name] = _constant(value).encode('utf-8')
+
+
+def code_hash(c):
+    """Hash of the check's code and everything it uses."""
+    h = hashlib.sha1(repr((CACHE_VERSION, sys.version_info[0], c.name, c.parts, c.collapsed)).encode('utf-8'))
+    h.update(_source(c.func))
+    found = {}
+    _dependencies(c.func, found)
+    for name in sorted(found):
+        h.update(name.encode('utf-8'))
+        h.update(found[name])
+    # The check is given Schematic / Part / Net objects, so their methods
+    # (connected_pin, io_standard, ...) are part of what it runs.
+    h.update(_source(_schematic_module))
+    return h.hexdigest()
+
+
+# ---------------------------------
+# Cache
+# ---------------------------------
+
+class CheckCache(object):
+    """On disk cache of check results.
+
+    traces/<hash of code and scope> holds the reads of the last run of a check
+    on a component (or the whole schematic), results/<hash of code and
+    subgraph> holds the problems found. Using an entry touches it, the least
+    recently used are evicted by prune().
+    """
+
+    def __init__(self, directory, max_entries=4096):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        for sub in ('traces', 'results'):
+            path = os.path.join(directory, sub)
+            if not os.path.isdir(path):
+                os.makedirs(path)
+
+    def _path(self, sub, *key):
+        return os.path.join(self.directory, sub, hashlib.sha1(repr(key).encode('utf-8')).hexdigest())
+
+    def _load(self, filename):
+        try:
+            with open(filename, 'rb') as f:
+                value = pickle.load(f)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            return None
+        os.utime(filename, None)
+        return value
+
+    def _store(self, filename, value):
+        fd, tmpname = tempfile.mkstemp(dir=os.path.dirname(filename), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(value, f, 2)
+            getattr(os, 'replace', os.rename)(tmpname, filename)
+        except Exception:
+            os.unlink(tmpname)
+            raise
+
+    def get(self, schematic, code, scope):
+        """Cached problems for the check, or None when it has to be run."""
+        reads = self._load(self._path('traces', code, scope))
+        if reads is not None:
+            problems = self._load(self._path('results', code, subgraph_hash(schematic, reads)))
+            if problems is not None:
+                self.hits += 1
+                return problems
+        self.misses += 1
+        return None
+
+    def put(self, schematic, code, scope, reads, problems):
+        reads = sorted(reads, key=repr)
+        self._store(self._path('traces', code, scope), reads)
+        self._store(self._path('results', code, subgraph_hash(schematic, reads)), problems)
+
+    def prune(self):
+        """Remove the least recently used entries over max_entries."""
+        for sub in ('traces', 'results'):
+            path = os.path.join(self.directory, sub)
+            entries = []
+            for name in os.listdir(path):
+                filename = os.path.join(path, name)
+                try:
+                    entries.append((os.stat(filename).st_mtime, filename))
+                except OSError:
+                    pass
+            entries.sort()
+            for _, filename in entries[:max(0, len(entries) - self.max_entries)]:
+                try:
+                    os.unlink(filename)
+                except OSError:
+                    pass
+
+
+# ---------------------------------
+# Running
+# ---------------------------------
+
+CheckResult = namedtuple("CheckResult", ['check', 'scope', 'problems', 'cached'])
+
+
+def _scopes(c, schematic):
+    if c.parts is None:
+        return [None]
+    return sorted(
+        name for name, component in schematic.components.items() if component.part in c.parts)
+
+
+CheckUnit = namedtuple("CheckUnit", ['check', 'target', 'scope'])
+
+
+def check_units(schematic=None, connectivity=None, checks=None):
+    """A CheckUnit for each check and component it runs on.
+
+    Checks which need a view that isn't given are skipped.
+    """
+    units = []
+    for c in (CHECKS if checks is None else checks):
+        target = connectivity if c.collapsed else schematic
+        if target is None:
+            continue
+        for scope in _scopes(c, target):
+            units.append(CheckUnit(c, target, scope))
+    return units
+
+
+_code_hashes = {}
+
+
+def run_unit(unit, cache=None):
+    """Run (or find in the cache) a single CheckUnit."""
+    c, target, scope = unit
+    if cache is not None:
+        if c not in _code_hashes:
+            _code_hashes[c] = code_hash(c)
+        code = _code_hashes[c]
+        problems = cache.get(target, code, scope)
+        if problems is not None:
+            return CheckResult(c.name, scope, problems, True)
+
+    traced = TracingSchematic(target)
+    if scope is None:
+        problems = list(c.func(traced))
+    else:
+        problems = list(c.func(traced, traced.components[scope]))
+
+    if cache is not None:
+        cache.put(target, code, scope, traced.reads, problems)
+    return CheckResult(c.name, scope, problems, False)
+
+
+def run_checks(schematic=None, connectivity=None, cache=None, checks=None):
+    """Run the checks, yielding a CheckResult for each check and component."""
+    for unit in check_units(schematic, connectivity, checks):
+        yield run_unit(unit, cache)
+
+    if cache is not None:
+        cache.prune()
+
+
+def report(results, out=sys.stderr):
+    """Write the problems found, returns the number of problems."""
+    count = 0
+    for r in results:
+        for problem in r.problems:
+            out.write("%s: %s\n" % (r.check, problem))
+        count += len(r.problems)
+    return count
+
+
+# ---------------------------------
+# Checks
+# ---------------------------------
+
+def _pins(part, description):
+    return sorted(p.name for p in part.pins.values() if p.description == description)
+
+
+@check('ip4776cz38-pins', parts=('IP4776CZ38',))
+def ip4776cz38_pins(schematic, component):
+    """The TMDS lines run through the IP4776CZ38, the pins on the opposite side
+    (pin 4 <-> 35 .. 15 <-> 24) must be on the same net. NC must be left
+    unconnected."""
+    part = schematic.parts[component.part]
+    pins2net = schematic.components2nets.get(component.name, {})
+    for pin in range(4, 16):
+        opposite = 39 - pin
+        net = pins2net.get(pin)
+        other_net = pins2net.get(opposite)
+        if net != other_net:
+            yield "%s pin %s (%s) is on %s but opposite pin %s is on %s" % (
+                component.name, pin, part.pins[pin].description, net, opposite, other_net)
+
+    for pin in _pins(part, 'NC'):
+        if pin not in pins2net:
+            continue
+        others = [c for c in schematic.nets[pins2net[pin]].connections if c.component != component.name]
+        if others:
+            yield "%s pin %s is NC but connected to %s" % (
+                component.name, pin, ", ".join(
+                    "%s.%s" % (c.component, pin_str(c.pin)) for c in sorted(others)))
+
+
+FPGA_PAIR_RE = re.compile(r'^\*?(?:IO_L([0-9]+)([PN])_.*?([0-9]+)|MGT(TX|RX)([PN])([0-9]+)_([0-9]+))$')
+
+
+def fpga_pair(description):
+    """(pair, polarity) for a Spartan 6 differential capable pin.
+
+    "IO_L29P_GCLK3_2" is (('L29', '2'), 'P'), "MGTTXN1_123" is
+    (('TX1', '123'), 'N').
+    """
+    match = FPGA_PAIR_RE.match(description)
+    if not match:
+        return None, None
+    lane, polarity, bank, direction, mgt_polarity, mgt_lane, tile = match.groups()
+    if lane:
+        return ('L' + lane, bank), polarity
+    return (direction + mgt_lane, tile), mgt_polarity
+
+
+def _fpga_balls(schematic, component, pin):
+    pins2net = schematic.components2nets.get(component.name, {})
+    if pin not in pins2net:
+        return []
+    fpga = schematic.get_fpga()
+    return sorted(
+        (c.pin for c in schematic.nets[pins2net[pin]].connections if c.component == fpga),
+        key=repr)
+
+
+def _fpga_part(schematic):
+    fpga = schematic.get_fpga()
+    if fpga is None:
+        return None
+    return schematic.parts[schematic.components[fpga].part]
+
+
+def _check_pairs(schematic, component, pairs):
+    fpga_part = _fpga_part(schematic)
+    if fpga_part is None:
+        return
+    part = schematic.parts[component.part]
+    for p_desc, n_desc in pairs:
+        balls = {}
+        for desc, polarity in ((p_desc, 'P'), (n_desc, 'N')):
+            for pin in _pins(part, desc):
+                for ball in _fpga_balls(schematic, component, pin):
+                    balls.setdefault(polarity, []).append(ball)
+        if not balls:
+            continue
+
+        if set(balls) != set('PN') or len(balls['P']) != 1 or len(balls['N']) != 1:
+            yield "%s %s/%s go to FPGA balls %s" % (
+                component.name, p_desc, n_desc,
+                ", ".join("%s=%s" % (k, "/".join(pin_str(b) for b in v)) for k, v in sorted(balls.items())))
+            continue
+
+        p_ball, n_ball = balls['P'][0], balls['N'][0]
+        p_pair, p_polarity = fpga_pair(fpga_part.pins[p_ball].description)
+        n_pair, n_polarity = fpga_pair(fpga_part.pins[n_ball].description)
+        if p_polarity != 'P' or n_polarity != 'N' or p_pair != n_pair:
+            yield "%s %s/%s are on %s (%s) / %s (%s) which aren't a P/N pair" % (
+                component.name, p_desc, n_desc,
+                pin_str(p_ball), fpga_part.pins[p_ball].description,
+                pin_str(n_ball), fpga_part.pins[n_ball].description)
+
+
+HDMI_PAIRS = [('D0+', 'D0-'), ('D1+', 'D1-'), ('D2+', 'D2-'), ('CLK+', 'CLK-')]
+
+
+@check('hdmi-pairs', parts=('HDMI',), collapsed=True)
+def hdmi_pairs(schematic, component):
+    """HDMI TMDS pairs must end up on a P/N pair of the same FPGA bank."""
+    return _check_pairs(schematic, component, HDMI_PAIRS)
+
+
+DISPLAYPORT_PAIRS = [('ML_LaneP%d' % i, 'ML_LaneN%d' % i) for i in range(4)] + [('AUXCH_P', 'AUXCH_N')]
+
+
+@check('displayport-pairs', parts=('DISPLAY_PORT',), collapsed=True)
+def displayport_pairs(schematic, component):
+    """DisplayPort main link and AUX pairs must end up on a P/N pair."""
+    return _check_pairs(schematic, component, DISPLAYPORT_PAIRS)
+
+
+@check('hdmi-clock-gclk', parts=('HDMI',), collapsed=True)
+def hdmi_clock_gclk(schematic, component):
+    """The HDMI clock pair must be on global clock (GCLK) pins."""
+    fpga_part = _fpga_part(schematic)
+    if fpga_part is None:
+        return
+    part = schematic.parts[component.part]
+    for desc in ('CLK+', 'CLK-'):
+        for pin in _pins(part, desc):
+            for ball in _fpga_balls(schematic, component, pin):
+                description = fpga_part.pins[ball].description
+                if 'GCLK' not in description:
+                    yield "%s %s is on %s (%s) which isn't a GCLK pin" % (
+                        component.name, desc, pin_str(ball), description)
@@ -0,0 +1,326 @@
+#!/usr/bin/env python
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+"""
+Command line interface, `circuit-unittests <command> ...`.
+
+Only argparse is imported up front, each command imports the modules it needs
+when it runs so --help and snapshot queries start quickly.
+"""
+
+import argparse
+import contextlib
+import sys
+
+
+def _load(filename, libs=(), jobs=None):
+    """(schematic, connectivity) for a netlist, schematic or snapshot.
+
+    Snapshots only hold the connectivity, the schematic is None for them.
+    """
+    if filename.endswith('.snap'):
+        from . import snapshot
+        return None, snapshot.open_snapshot(filename)
+
+    from .connectivity import build_connectivity
+    from .netlist import load_schematic
+    schematic = load_schematic(filename, libs, jobs)
+    return schematic, build_connectivity(schematic)
+
+
+@contextlib.contextmanager
+def _output(args):
+    """The -o file (closed when done) or stdout (flushed when done)."""
+    if args.output:
+        with open(args.output, 'w') as f:
+            yield f
+    else:
+        yield sys.stdout
+        sys.stdout.flush()
+
+
+def _check_ddr3(schematic, check, groups):
+    from . import ddr3
+    interfaces = ddr3.analyze(schematic)
+    if groups:
+        with open(groups, 'w') as f:
+            ddr3.write_groups(interfaces, f)
+    if check:
+        return ddr3.report(interfaces)
+    return 0
+
+
+def _run_checks(schematic, connectivity, cache_dir):
+    from . import checks
+    cache = None
+    if cache_dir:
+        cache = checks.CheckCache(cache_dir)
+    return checks.report(checks.run_checks(schematic, connectivity, cache))
+
+
+# ---------------------------------
+# Commands
+# ---------------------------------
+
+def cmd_constraints(parser, args):
+    from . import constraints
+
+    if args.max_memory is not None:
+        if not args.netlist.endswith('.xml'):
+            parser.error("--max-memory needs an exported netlist (.xml)")
+        if args.snapshot or args.check_ddr3 or args.ddr3_groups or args.checks:
+            parser.error("--max-memory can't be used with --snapshot or the checks")
+
+        from . import outofcore
+        with _output(args) as out:
+            constraints.write_constraints(
+                outofcore.pin_constraints(args.netlist, args.max_memory), out, args.format)
+        return 0
+
+    if args.netlist.endswith('.snap') and (args.check_ddr3 or args.ddr3_groups):
+        parser.error("The DDR3 checks need a netlist or schematic, not a snapshot")
+
+    schematic, connectivity = _load(args.netlist, args.lib, args.jobs)
+
+    if args.snapshot:
+        from . import snapshot
+        snapshot.write_snapshot(args.snapshot, connectivity)
+
+    if args.check_ddr3 or args.ddr3_groups:
+        if _check_ddr3(schematic, args.check_ddr3, args.ddr3_groups):
+            return 1
+
+    if args.checks:
+        if _run_checks(schematic, connectivity, args.check_cache):
+            return 1
+
+    with _output(args) as out:
+        constraints.write_constraints(constraints.pin_constraints(connectivity), out, args.format)
+    return 0
+
+
+def cmd_snapshot(parser, args):
+    from . import snapshot
+    _, connectivity = _load(args.netlist, args.lib, args.jobs)
+    snapshot.write_snapshot(args.snapshot, connectivity)
+    return 0
+
+
+def cmd_check(parser, args):
+    if args.netlist.endswith('.snap') and (args.ddr3 or args.ddr3_groups):
+        parser.error("The DDR3 checks need a netlist or schematic, not a snapshot")
+
+    import os
+    from . import checks, runner
+
+    schematic, connectivity = _load(args.netlist, args.lib, args.jobs)
+
+    cache = None
+    timings = args.timings
+    if args.cache:
+        cache = checks.CheckCache(args.cache)
+        if timings is None:
+            timings = os.path.join(args.cache, 'timings.json')
+
+    results = runner.run(
+        checks.check_units(schematic, connectivity),
+        cache=cache,
+        timings=runner.Timings(timings),
+        check_budget=args.check_budget,
+        budget=args.budget,
+        fail_fast=args.fail_fast,
+        )
+    with _output(args) as out:
+        failed = runner.WRITERS[args.format](out).write_all(results)
+    if failed and args.fail_fast:
+        return 1
+
+    if args.ddr3 or args.ddr3_groups:
+        failed += _check_ddr3(schematic, args.ddr3, args.ddr3_groups)
+    return 1 if failed else 0
+
+
+def cmd_query(parser, args):
+    from .constraints import pin_key, pin_str
+
+    _, connectivity = _load(args.netlist, args.lib, args.jobs)
+    if args.component not in connectivity.components:
+        parser.error("No component %s" % args.component)
+
+    component = connectivity.components[args.component]
+    part = connectivity.parts[component.part]
+    pins2net = connectivity.components2nets.get(component.name, {})
+    fpga = connectivity.get_fpga()
+
+    out = sys.stdout
+    out.write("%s %s\n" % (component.name, component.part))
+    for pin in sorted(part.pins.values(), key=lambda p: pin_key(p.name)):
+        if args.pin and pin_str(pin.name) not in args.pin:
+            continue
+        if pin.name not in pins2net:
+            out.write("    %-6s %-20s NC\n" % (pin_str(pin.name), pin.description))
+            continue
+
+        net = connectivity.nets[pins2net[pin.name]]
+        netname = net.name if not isinstance(net.name, tuple) else " / ".join(net.name)
+        balls = sorted((c.pin for c in net.connections if c.component == fpga), key=pin_key)
+        out.write("    %-6s %-20s %s%s\n" % (
+            pin_str(pin.name), pin.description, netname,
+            "".join(" -> %s" % pin_str(b) for b in balls)))
+    return 0
+
+
+def cmd_matrix(parser, args):
+    from .constraints import pin_str
+    from .pinmatrix import PinMatrix, build_pin_matrix, VIA, PULLED
+
+    if args.netlist.endswith('.npz'):
+        matrix = PinMatrix.load(args.netlist)
+    else:
+        _, connectivity = _load(args.netlist, args.lib, args.jobs)
+        matrix = build_pin_matrix(connectivity)
+    if args.output:
+        matrix.save(args.output)
+
+    out = sys.stdout
+    if not args.between:
+        out.write("%d pins, %d connections, %d components\n" % (
+            matrix.shape[0], matrix.nnz, len(matrix.components)))
+        return 0
+
+    a, b = args.between
+    for name in (a, b):
+        if name not in matrix.components:
+            parser.error("No component %s" % name)
+    for pin_a, pin_b, label in matrix.between(a, b):
+        out.write("%s %-6s %s %-6s%s%s\n" % (
+            a, pin_str(pin_a), b, pin_str(pin_b),
+            " via" if label & VIA else "", " pulled" if label & PULLED else ""))
+    return 0
+
+
+def cmd_netload(parser, args):
+    from . import netload
+    _, connectivity = _load(args.netlist, args.lib, args.jobs)
+    with _output(args) as out:
+        problems = netload.report(netload.net_loads(connectivity), out, show_all=args.all)
+    return 1 if problems else 0
+
+
+def cmd_compare(parser, args):
+    from . import signatures
+    old = signatures.ball_signatures(_load(args.old, args.lib, args.jobs)[1])
+    new = signatures.ball_signatures(_load(args.new, args.lib, args.jobs)[1])
+    with _output(args) as out:
+        differences = signatures.report(signatures.compare(old, new), out)
+    return 1 if differences else 0
+
+
+def cmd_annotate(parser, args):
+    import kicad_netlist_reader
+    from .annotate import annotations, write_jsonl
+
+    with _output(args) as out:
+        write_jsonl(annotations(kicad_netlist_reader.netlist(args.netlist)), out)
+    return 0
+
+
+def cmd_pcb(parser, args):
+    from . import pcb
+    problems = pcb.report(pcb.PCB.load(args.pcb))
+    return 1 if problems else 0
+
+
+# ---------------------------------
+
+def _add_input(parser, help="Eeschema exported netlist (.xml), schematic (.sch) or snapshot (.snap)"):
+    parser.add_argument('netlist', help=help)
+    parser.add_argument('--lib', action='append', default=[], help="Extra symbol library (.lib) for .sch files")
+    parser.add_argument('-j', '--jobs', type=int, help="Processes used to parse .sch files")
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(prog='circuit-unittests', description="Checks for KiCad schematics and PCBs.")
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+
+    p = commands.add_parser('constraints', help="Generate FPGA pin constraints from a schematic")
+    _add_input(p)
+    # constraints.WRITERS, listed here so --help doesn't import the writers.
+    p.add_argument('-f', '--format', choices=['json', 'pcf', 'ucf', 'xdc'], default='ucf')
+    p.add_argument('-o', '--output', help="Output file (default stdout)")
+    p.add_argument('--snapshot', help="Write the connectivity to this snapshot file")
+    p.add_argument('--check-ddr3', action='store_true', help="Check the DRAMs are on the right MCB pins")
+    p.add_argument('--ddr3-groups', help="Write the DDR3 length matching groups (JSON) to this file")
+    p.add_argument('--checks', action='store_true', help="Run the schematic checks")
+    p.add_argument('--check-cache', metavar='DIR', help="Cache the check results in this directory")
+    p.add_argument('--max-memory', type=float, metavar='MB',
+                   help="Stream the netlist through sorted runs on disk using about this much memory")
+    p.set_defaults(func=cmd_constraints)
+
+    p = commands.add_parser('snapshot', help="Write the connectivity to a snapshot file")
+    _add_input(p, help="Eeschema exported netlist (.xml) or schematic (.sch)")
+    p.add_argument('snapshot', help="Snapshot file to write")
+    p.set_defaults(func=cmd_snapshot)
+
+    p = commands.add_parser('check', help="Run the schematic checks")
+    _add_input(p)
+    p.add_argument('--cache', metavar='DIR', help="Cache the check results in this directory")
+    # runner.WRITERS
+    p.add_argument('-f', '--format', choices=['jsonl', 'junit', 'tap', 'text'], default='text')
+    p.add_argument('-o', '--output', help="Output file (default stdout)")
+    p.add_argument('--timings', metavar='FILE',
+                   help="Check run times, used to run the cheapest first (default DIR/timings.json with --cache)")
+    p.add_argument('--budget', type=float, metavar='SECONDS', help="Time allowed for all the checks")
+    p.add_argument('--check-budget', type=float, metavar='SECONDS', help="Time allowed for each check")
+    p.add_argument('--fail-fast', action='store_true', help="Stop at the first check which fails")
+    p.add_argument('--ddr3', action='store_true', help="Check the DRAMs are on the right MCB pins")
+    p.add_argument('--ddr3-groups', help="Write the DDR3 length matching groups (JSON) to this file")
+    p.set_defaults(func=cmd_check)
+
+    p = commands.add_parser('query', help="Show what a component's pins are connected to")
+    _add_input(p)
+    p.add_argument('component', help="Component reference, e.g. J2")
+    p.add_argument('pin', nargs='*', help="Only these pins")
+    p.set_defaults(func=cmd_query)
+
+    p = commands.add_parser('matrix', help="Build the component pin to pin connectivity matrix")
+    _add_input(p, help="Eeschema exported netlist (.xml), schematic (.sch), snapshot (.snap) or matrix (.npz)")
+    p.add_argument('-o', '--output', help="Save the matrix to this .npz file")
+    p.add_argument('--between', nargs=2, metavar=('A', 'B'), help="Show the pins of A connected to pins of B")
+    p.set_defaults(func=cmd_matrix)
+
+    p = commands.add_parser('netload', help="Check the fanout and loading of each net against its speed")
+    _add_input(p)
+    p.add_argument('-o', '--output', help="Output file (default stdout)")
+    p.add_argument('--all', action='store_true', help="Write the summary of every net, not just the problems")
+    p.set_defaults(func=cmd_netload)
+
+    p = commands.add_parser('compare', help="Compare the FPGA pinout of two boards")
+    p.add_argument('old', help="Eeschema exported netlist (.xml), schematic (.sch) or snapshot (.snap)")
+    p.add_argument('new', help="Eeschema exported netlist (.xml), schematic (.sch) or snapshot (.snap)")
+    p.add_argument('--lib', action='append', default=[], help="Extra symbol library (.lib) for .sch files")
+    p.add_argument('-j', '--jobs', type=int, help="Processes used to parse .sch files")
+    p.add_argument('-o', '--output', help="Output file (default stdout)")
+    p.set_defaults(func=cmd_compare)
+
+    p = commands.add_parser('annotate', help="Write what every component pin is connected to (JSON Lines)")
+    p.add_argument('netlist', help="Eeschema exported netlist (.xml)")
+    p.add_argument('-o', '--output', help="Output file (default stdout)")
+    p.set_defaults(func=cmd_annotate)
+
+    p = commands.add_parser('pcb', help="Check the differential pair coupling and track spacing of a PCB")
+    p.add_argument('pcb', help="KiCad PCB (.kicad_pcb)")
+    p.set_defaults(func=cmd_pcb)
+
+    return parser
+
+
+def main(argv=None):
+    parser = make_parser()
+    args = parser.parse_args(argv)
+    return args.func(parser, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
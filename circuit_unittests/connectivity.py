@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+"""
+The connectivity of a schematic, with the nets joined through passives
+collapsed into single nets.
+"""
+
+from .schematic import Connection, Net, Pull, Schematic
+
+
+def build_connectivity(schematic):
+    """Collapse nets joined by passives into single nets, with the passives
+    connected to power recorded as pulls."""
+    connectivity = Schematic()
+    for part in schematic.parts.values():
+        connectivity.add_part(part)
+    for component in schematic.components.values():
+        connectivity.add_component(component)
+
+    for net in sorted(schematic.nets.values()):
+        if net.is_power:
+            continue
+
+        fake_name = [net.name]
+        fake_connections = set()
+        fake_pulls = set()
+
+        to_search_connections = set(net.connections)
+        searched_connections = set()
+        while len(to_search_connections) > len(searched_connections):
+            for connection in to_search_connections - searched_connections:
+                break
+            searched_connections.add(connection)
+
+            component = schematic.components[connection.component]
+
+            part = connectivity.parts[component.part]
+
+            other_pin = part.connected_pin(connection.pin)
+            assert other_pin != connection.pin
+            if not other_pin:
+                fake_connections.add(connection)
+                continue
+
+            other_net = schematic.net_for_pin(component, other_pin)
+            assert net.name != other_net.name, "%s == %s" % (net.name, other_net.name)
+            if other_net.is_power:
+                fake_pulls.add(Pull(net=net.name, via=component.name, to=other_net.name))
+                continue
+
+            fake_name.append(other_net.name)
+            for c in other_net.connections:
+                if c.component == component.name:
+                    continue
+                to_search_connections.add(Connection(c.component, c.pin, (component.name, other_net.name)))
+
+        #if fake_name[0].startswith('Net'):
+        #    continue
+
+        fake_net = Net(name=tuple(sorted(fake_name)))
+        for c in fake_connections:
+            fake_net.add_connection(c)
+        for p in fake_pulls:
+            fake_net.pulls.add(p)
+
+        if fake_net.name in connectivity.nets:
+            existing_net = connectivity.nets[fake_net.name]
+            for ca, cb in zip(list(sorted(existing_net.connections)), list(sorted(fake_net.connections))):
+                assert ca.component == cb.component, "%r != %r" % (ca.component, cb.component)
+                assert ca.pin == cb.pin, "%r != %r" % (ca.pin, cb.pin)
+            #assert fake_net == existing_net, "\n%r\n !=\n%r" % (fake_net, existing_net)
+            continue
+
+        connectivity.add_net(fake_net)
+
+    return connectivity
+
@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+"""
+Pin constraints for the FPGA.
+
+The constraints are first collected into a list of PinConstraint records (one
+per FPGA ball connected to a component pin), which the writers then turn into
+UCF, XDC, PCF or JSON. Each writer produces lines and writes them out in large
+chunks rather than one small write per fragment.
+"""
+
+import json
+
+from collections import namedtuple
+
+
+PinConstraint = namedtuple("PinConstraint", [
+    'net', 'loc', 'iostandard', 'pulls', 'component', 'part', 'pin', 'direction'])
+PullConstraint = namedtuple("PullConstraint", ['strength', 'to', 'via', 'value'])
+
+
+def to_value(a):
+    if not isinstance(a, float):
+        return a
+    if a >= 1e6:
+        return "{0}M".format(int(a/1e6))
+    elif a >= 1e3:
+        return "{0}k".format(int(a/1e3))
+    return "{0}".format(a)
+
+
+def pin_str(pin):
+    if isinstance(pin, tuple):
+        return "%s%s" % pin
+    return str(pin)
+
+
+def pin_key(pin):
+    """Sort key for pin names which can be ints, strings or (letter, number)."""
+    if isinstance(pin, int):
+        return (0, '', pin)
+    elif isinstance(pin, tuple):
+        return (2, pin[0], pin[1])
+    return (1, pin, 0)
+
+
+def _value_key(value):
+    if isinstance(value, float):
+        return (0, value, '')
+    return (1, 0, str(value))
+
+
+def net_connected_to_fpga(schematic, net):
+    for connection in net.connections:
+        if connection.component == schematic.get_fpga():
+            return True
+    return False
+
+
+def component_connected_to_fpga(schematic, component):
+    if component == schematic.get_fpga():
+        return False
+    if component.name not in schematic.components2nets:
+        return False
+
+    nets = schematic.components2nets[component.name]
+    for netname in nets.values():
+        if net_connected_to_fpga(schematic, schematic.nets[netname]):
+            return True
+
+    return False
+
+
+def pull_constraint(to, via, value):
+    strength = 'unknown'
+    if isinstance(value, float):
+        if value > 10e3:
+            strength = 'Weakly'
+        else:
+            strength = 'Strongly'
+    return PullConstraint(strength, to, via, value)
+
+
+def _pulls(schematic, net):
+    pulls = []
+    for pull in sorted(net.pulls):
+        comp = schematic.components[pull.via]
+        if comp.part != 'R':
+            continue
+        pulls.append(pull_constraint(pull.to, pull.via, comp.fields.get('value')))
+    return tuple(pulls)
+
+
+def component_key(component, fpga):
+    """Sort key for the components which get constraints, None for the rest.
+
+    Connectors come first (ordered by part, then fields), followed by the other
+    components in name order.
+    """
+    if component.name == fpga or component.part == "IP4776CZ38":
+        return None
+    if component.is_connector:
+        fields = component.fields
+        return (0, component.part, [_value_key(fields[k]) for k in sorted(fields)], component.name)
+    elif not component.is_passive:
+        return (1, component.name)
+    return None
+
+
+def component_pins(part, component):
+    """The part's pins in the order their constraints are written."""
+    if component.is_connector:
+        return sorted(part.pins.values(), key=lambda p: pin_key(p.name))
+    return sorted(part.pins.values(), key=lambda p: (p.description, pin_key(p.name)))
+
+
+def constraints_for_pin(part, component, pin, locs, pulls):
+    """A PinConstraint for each FPGA ball (locs, in pin_key order) on the pin."""
+    netname = part.net_name(pin)
+    if netname is not None:
+        netname = netname.format(component.name.lower())
+    else:
+        netname = "???"
+    iostandard = part.io_standard(pin)
+    direction = None
+    if component.is_connector:
+        direction = component.fields.get('direction')
+
+    for loc in locs:
+        yield PinConstraint(
+            net=netname,
+            loc=pin_str(loc),
+            iostandard=iostandard,
+            pulls=pulls,
+            component=component.name,
+            part=part.name,
+            pin=pin,
+            direction=direction,
+            )
+
+
+def _component_constraints(schematic, component):
+    part = schematic.parts[component.part]
+    pins2net = schematic.components2nets[component.name]
+    fpga = schematic.get_fpga()
+
+    for pin in component_pins(part, component):
+        if pin.name not in pins2net:
+            continue
+
+        net = schematic.nets[pins2net[pin.name]]
+        locs = sorted((c.pin for c in net.connections if c.component == fpga), key=pin_key)
+        if not locs:
+            continue
+
+        for c in constraints_for_pin(part, component, pin.name, locs, _pulls(schematic, net)):
+            yield c
+
+
+def pin_constraints(schematic):
+    """Constraints for every component pin connected to the FPGA, ordered by
+    component_key()."""
+    fpga = schematic.get_fpga()
+    components = []
+    for component in schematic.components.values():
+        key = component_key(component, fpga)
+        if key is not None:
+            components.append((key, component))
+
+    constraints = []
+    for _, component in sorted(components, key=lambda c: c[0]):
+        if not component_connected_to_fpga(schematic, component):
+            continue
+        constraints.extend(_component_constraints(schematic, component))
+
+    return constraints
+
+
+# ---------------------------------
+# Writers
+# ---------------------------------
+
+def write_lines(lines, out, chunk_size=4096):
+    """Write the lines to out, chunk_size lines joined together at a time."""
+    buf = []
+    for line in lines:
+        buf.append(line)
+        if len(buf) >= chunk_size:
+            out.write(''.join(buf))
+            del buf[:]
+    if buf:
+        out.write(''.join(buf))
+
+
+class ConstraintWriter(object):
+    """Base class for the writers, subclasses provide lines()."""
+
+    # Number of lines joined together for each write to the output.
+    chunk_size = 4096
+
+    def __init__(self, out):
+        self.out = out
+
+    def lines(self, constraints):
+        raise NotImplementedError()
+
+    def write(self, constraints):
+        write_lines(self.lines(constraints), self.out, self.chunk_size)
+
+
+class _GroupedWriter(ConstraintWriter):
+    """Writer which outputs a header and the pulls for each component / pin."""
+
+    comment = '#'
+
+    def lines(self, constraints):
+        component = None
+        pin = None
+        for c in constraints:
+            if c.component != component:
+                if component is not None:
+                    for line in self.footer():
+                        yield line
+                component = c.component
+                pin = None
+                for line in self.header(c):
+                    yield line
+
+            if c.pin != pin:
+                pin = c.pin
+                for pull in c.pulls:
+                    value = '??' if pull.value is None else pull.value
+                    yield "%s \\/ %s pulled (%s) to %s via %s\n" % (
+                        self.comment, pull.strength, to_value(value), pull.to, pull.via)
+
+            for line in self.constraint(c):
+                yield line
+
+        if component is not None:
+            for line in self.footer():
+                yield line
+
+    def header(self, c):
+        yield "%s %s - connector %s\n" % (self.comment, c.part, c.component)
+
+    def footer(self):
+        yield "\n"
+
+    def constraint(self, c):
+        raise NotImplementedError()
+
+
+class UCFWriter(_GroupedWriter):
+    def header(self, c):
+        if c.direction is not None:
+            yield "# %s - connector %s - Direction %s\n" % (c.part, c.component, c.direction)
+        else:
+            yield "# %s - connector %s\n" % (c.part, c.component)
+
+    def constraint(self, c):
+        yield 'NET "%s"%s LOC = %5s  IOSTANDARD = %15s;\n' % (
+            c.net, " " * (20 - len(c.net)), c.loc, c.iostandard)
+
+
+class XDCWriter(_GroupedWriter):
+    def constraint(self, c):
+        yield "set_property PACKAGE_PIN %s [get_ports {%s}]\n" % (c.loc, c.net)
+        if c.iostandard:
+            yield "set_property IOSTANDARD %s [get_ports {%s}]\n" % (c.iostandard, c.net)
+
+
+class PCFWriter(_GroupedWriter):
+    def constraint(self, c):
+        yield "set_io %s %s\n" % (c.net, c.loc)
+
+
+class JSONWriter(ConstraintWriter):
+    def lines(self, constraints):
+        yield "["
+        sep = "\n"
+        for c in constraints:
+            record = c._asdict()
+            record['pin'] = pin_str(c.pin)
+            record['pulls'] = [p._asdict() for p in c.pulls]
+            yield sep + json.dumps(record, sort_keys=True)
+            sep = ",\n"
+        yield "\n]\n"
+
+
+WRITERS = {
+    'ucf': UCFWriter,
+    'xdc': XDCWriter,
+    'pcf': PCFWriter,
+    'json': JSONWriter,
+}
+
+
+def write_constraints(constraints, out, format='ucf'):
+    WRITERS[format](out).write(constraints)
@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+"""
+DDR3 memory interface checks for DRAMs connected to the Spartan 6 memory
+controller blocks (MCB).
+
+The Spartan 6 MCB has fixed pins, each DRAM signal must end up on the FPGA
+ball which has the matching MCB function (for example DQ5 on the M3DQ5 ball)
+and every signal of a DRAM must be on the same MCB.
+
+Each DRAM pin is followed through series passives and resistor networks
+(terminations to VTT are recorded, not followed) to the FPGA. The pins are
+grouped into byte lanes, address / command and clock groups which are also
+exported so the PCB checks can length match them.
+"""
+
+import json
+import re
+import sys
+
+from collections import namedtuple
+
+from .constraints import pin_str
+
+
+# DRAM parts, and the pins which can be left unconnected on them.
+DRAM_PARTS = {
+    'MT41J128M16': ('A14',),
+}
+
+# DRAM pin -> (group, MCB function)
+DRAM_PINS = {
+    'LDM': ('lane0', 'LDM'),
+    'LDQS': ('lane0', 'LDQS'),
+    'LDQS_N': ('lane0', 'LDQSN'),
+    'UDM': ('lane1', 'UDM'),
+    'UDQS': ('lane1', 'UDQS'),
+    'UDQS_N': ('lane1', 'UDQSN'),
+    'CK': ('clock', 'CLK'),
+    'CK_N': ('clock', 'CLKN'),
+    'RAS_N': ('command', 'RASN'),
+    'CAS_N': ('command', 'CASN'),
+    'WE_N': ('command', 'WE'),
+    'CKE': ('command', 'CKE'),
+    'ODT': ('command', 'ODT'),
+    'RESET_N': ('command', 'RESET'),
+}
+for i in range(16):
+    DRAM_PINS['DQ%d' % i] = ('lane%d' % (i // 8), 'DQ%d' % i)
+for i in range(15):
+    DRAM_PINS['A%d' % i] = ('address', 'A%d' % i)
+for i in range(3):
+    DRAM_PINS['BA%d' % i] = ('address', 'BA%d' % i)
+
+
+MCB_PIN_RE = re.compile(r'_M([1-4])(DQ[0-9]+|BA[0-9]|A[0-9]+|RASN|CASN|WE|CKE|ODT|RESET|CLKN?|[LU]DQSN?|[LU]DM)_')
+
+
+def mcb_pins(part):
+    """FPGA ball -> (MCB number, MCB function) for the part."""
+    table = {}
+    for pin in part.pins.values():
+        match = MCB_PIN_RE.search(pin.description)
+        if match:
+            table[pin.name] = (int(match.group(1)), match.group(2))
+    return table
+
+
+def dram_signal(description):
+    """DRAM signal for a pin description, "A10/AP" is A10."""
+    return description.split('/')[0]
+
+
+# ---------------------------------
+
+Route = namedtuple("Route", ['ball', 'via', 'nets', 'pulls'])
+
+DRAMPin = namedtuple("DRAMPin", [
+    'dram', 'pin', 'signal', 'group', 'function', 'ball', 'mcb', 'mcb_function', 'via', 'nets', 'pulls'])
+
+Interface = namedtuple("Interface", ['dram', 'part', 'mcb', 'pins', 'problems'])
+
+
+def routes_to_fpga(schematic, component, pin):
+    """FPGA balls reached from a component pin.
+
+    Nets are followed through the passives in a breadth first search, only the
+    balls reached through the fewest passives are returned (so a differential
+    termination resistor across a pair doesn't connect both balls).
+    """
+    fpga = schematic.get_fpga()
+    pins2net = schematic.components2nets.get(component.name, {})
+    if pin not in pins2net:
+        return []
+
+    start = schematic.nets[pins2net[pin]]
+    seen = set([start.name])
+    # (net, passives, nets, pulls) for the paths reaching each net.
+    level = [(start, (), (start.name,), ())]
+    while level:
+        found = []
+        next_level = []
+        for net, via, nets, pulls in level:
+            balls = []
+            next_nets = []
+            net_pulls = list(pulls)
+            for c in sorted(net.connections, key=lambda c: (c.component, pin_str(c.pin))):
+                if c.component == fpga:
+                    balls.append(c.pin)
+                    continue
+
+                if c.component == component.name:
+                    continue
+
+                other = schematic.components[c.component]
+                other_pin = schematic.parts[other.part].connected_pin(c.pin)
+                if not other_pin:
+                    continue
+                other_netname = schematic.components2nets[other.name].get(other_pin)
+                if other_netname is None or other_netname in seen:
+                    continue
+
+                other_net = schematic.nets[other_netname]
+                if other_net.is_power:
+                    net_pulls.append((other.name, other_netname))
+                    continue
+
+                seen.add(other_netname)
+                next_nets.append((other_net, via + (other.name,), nets + (other_netname,)))
+
+            # The pulls of every net on the path, not just the last one.
+            net_pulls = tuple(net_pulls)
+            found.extend(Route(ball, via, nets, net_pulls) for ball in balls)
+            next_level.extend((n, v, ns, net_pulls) for n, v, ns in next_nets)
+        if found:
+            return found
+        level = next_level
+    return []
+
+
+def analyze(schematic):
+    """Find the DRAMs in the schematic and check their MCB pin assignment."""
+    fpga_name = schematic.get_fpga()
+    if fpga_name is None:
+        return []
+    fpga_part = schematic.parts[schematic.components[fpga_name].part]
+    mcb_table = mcb_pins(fpga_part)
+
+    interfaces = []
+    for component in sorted(schematic.components.values(), key=lambda c: c.name):
+        if component.part not in DRAM_PARTS:
+            continue
+        optional = DRAM_PARTS[component.part]
+        part = schematic.parts[component.part]
+
+        pins = []
+        problems = []
+        for pin in part.pins.values():
+            signal = dram_signal(pin.description)
+            if signal not in DRAM_PINS:
+                continue
+            group, function = DRAM_PINS[signal]
+
+            routes = routes_to_fpga(schematic, component, pin.name)
+            if not routes:
+                if signal not in optional:
+                    problems.append("%s %s (pin %s) is not connected to the FPGA" % (
+                        component.name, signal, pin_str(pin.name)))
+                continue
+            if len(routes) > 1:
+                problems.append("%s %s (pin %s) is connected to several FPGA balls %s" % (
+                    component.name, signal, pin_str(pin.name),
+                    ", ".join(pin_str(r.ball) for r in routes)))
+
+            route = routes[0]
+            mcb, mcb_function = mcb_table.get(route.ball, (None, None))
+            pins.append(DRAMPin(
+                dram=component.name, pin=pin.name, signal=signal, group=group,
+                function=function, ball=route.ball, mcb=mcb, mcb_function=mcb_function,
+                via=route.via, nets=route.nets, pulls=route.pulls))
+
+        mcbs = sorted(set(p.mcb for p in pins if p.mcb is not None))
+        mcb = None
+        if mcbs:
+            # The MCB with most of the DRAM's signals is the one in use.
+            mcb = max(mcbs, key=lambda m: sum(1 for p in pins if p.mcb == m))
+        if len(mcbs) > 1:
+            problems.append("%s is split across MCBs %s" % (
+                component.name, ", ".join("M%s" % m for m in mcbs)))
+
+        for p in sorted(pins, key=lambda p: (p.group, p.signal)):
+            if p.mcb is None:
+                problems.append("%s %s is on FPGA ball %s which isn't an MCB pin" % (
+                    p.dram, p.signal, pin_str(p.ball)))
+            elif p.mcb_function != p.function:
+                problems.append("%s %s is on FPGA ball %s which is M%s%s, should be M%s%s" % (
+                    p.dram, p.signal, pin_str(p.ball), p.mcb, p.mcb_function, mcb, p.function))
+
+        interfaces.append(Interface(
+            dram=component.name, part=component.part, mcb=mcb, pins=pins, problems=problems))
+
+    # Each MCB can only drive a single DRAM.
+    by_mcb = {}
+    for interface in interfaces:
+        if interface.mcb is not None:
+            by_mcb.setdefault(interface.mcb, []).append(interface.dram)
+    for mcb, drams in sorted(by_mcb.items()):
+        if len(drams) > 1:
+            for interface in interfaces:
+                if interface.dram in drams:
+                    interface.problems.append("MCB M%s is shared by %s" % (mcb, ", ".join(drams)))
+
+    return interfaces
+
+
+def length_groups(interfaces):
+    """Groups of nets (DRAM side to FPGA side) which should be length matched."""
+    groups = {}
+    for interface in interfaces:
+        for p in interface.pins:
+            name = "%s_%s" % (interface.dram, p.group)
+            groups.setdefault(name, {})[p.signal] = {
+                'ball': pin_str(p.ball),
+                'nets': list(p.nets),
+                'via': list(p.via),
+                'terminations': [list(t) for t in p.pulls],
+                }
+    return groups
+
+
+def write_groups(interfaces, out):
+    json.dump(length_groups(interfaces), out, indent=2, sort_keys=True)
+    out.write("\n")
+
+
+def report(interfaces, out=sys.stderr):
+    """Write the problems found, returns the number of problems."""
+    count = 0
+    for interface in interfaces:
+        mcb = "M%s" % interface.mcb if interface.mcb is not None else "no MCB"
+        out.write("# DDR3 %s (%s) on %s - %d pins, %d problems\n" % (
+            interface.dram, interface.part, mcb, len(interface.pins), len(interface.problems)))
+        for problem in interface.problems:
+            out.write("  %s\n" % problem)
+        count += len(interface.problems)
+    return count
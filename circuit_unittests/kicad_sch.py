@@ -0,0 +1,439 @@
+#!/usr/bin/env python
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+"""
+Reader for Eeschema (legacy format) .sch and .lib files.
+
+Builds the same parts / components / nets that the Eeschema netlist export
+contains, so the checks can be run directly on the schematic without first
+exporting a netlist.
+
+Connectivity is resolved from
+ * wires (a pin, label, junction or wire end touching any point of a wire is
+   connected to it),
+ * local labels (within a sheet instance),
+ * global labels, power symbols and hidden power pins (across the whole
+   design),
+ * hierarchical labels and the matching sheet pins in the parent sheet.
+
+Buses and bus entries are not resolved.
+
+Sheet and library files are parsed in parallel, one process per file.
+"""
+
+import os
+import re
+import sys
+
+from collections import namedtuple
+
+
+LibPin = namedtuple("LibPin", ["num", "name", "type"])
+LibPart = namedtuple("LibPart", ["name", "pins"])
+SchComponent = namedtuple("SchComponent", ["ref", "part", "value", "fields"])
+SchNet = namedtuple("SchNet", ["name", "nodes"])
+
+Netlist = namedtuple("Netlist", ["libparts", "components", "nets"])
+
+
+PIN_TYPES = {
+    'I': 'input',
+    'O': 'output',
+    'B': 'BiDi',
+    'T': '3state',
+    'P': 'passive',
+    'U': 'unspc',
+    'W': 'power_in',
+    'w': 'power_out',
+    'C': 'openCol',
+    'E': 'openEm',
+    'N': 'NotConnected',
+}
+
+# Lower is preferred when picking the name of a net, as Eeschema does. Then
+# labels nearer the top of the hierarchy, then by label text. Sheet pins never
+# name a net, only the hierarchical labels they join.
+NAME_POWER = 0
+NAME_GLOBAL = 1
+NAME_HIER = 2
+NAME_LOCAL = 3
+
+
+_FIELD_RE = re.compile(r'"((?:[^"\\]|\\.)*)"|(\S+)')
+
+
+def _split(line):
+    return [q if q or not u else u for q, u in _FIELD_RE.findall(line)]
+
+
+# ---------------------------------
+# File parsers, these run in the worker processes so only return plain data.
+# ---------------------------------
+
+def parse_lib_file(filename):
+    """Returns {symbol name: (power, [(num, name, x, y, unit, convert, type, hidden)])}."""
+    symbols = {}
+    with open(filename) as f:
+        lines = iter(f.read().splitlines())
+
+    for line in lines:
+        if not line.startswith('DEF '):
+            continue
+        tokens = _split(line)
+        names = [tokens[1].lstrip('~')]
+        power = len(tokens) > 9 and tokens[9] == 'P'
+        pins = []
+        for line in lines:
+            if line.startswith('ENDDEF'):
+                break
+            elif line.startswith('ALIAS '):
+                names.extend(line.split()[1:])
+            elif line.startswith('X '):
+                t = line.split()
+                shape = t[12] if len(t) > 12 else ''
+                pins.append((
+                    t[2], t[1], int(t[3]), int(t[4]), int(t[9]), int(t[10]),
+                    PIN_TYPES.get(t[11], 'unspc'), shape.startswith('N')))
+        for name in names:
+            symbols.setdefault(name, (power, pins))
+    return symbols
+
+
+def parse_sheet_file(filename):
+    """Returns the components, wires, labels and sheets in a .sch file."""
+    sheet = {
+        'libs': [],
+        'components': [],
+        'wires': [],
+        'junctions': [],
+        'labels': [],
+        'sheets': [],
+        }
+
+    with open(filename) as f:
+        lines = iter(f.read().splitlines())
+
+    for line in lines:
+        if line.startswith('LIBS:'):
+            sheet['libs'].append(line[5:].strip())
+
+        elif line.startswith('$Comp'):
+            comp = {'fields': {}, 'ar': {}}
+            for line in lines:
+                if line.startswith('$EndComp'):
+                    break
+                tokens = _split(line)
+                if not tokens:
+                    continue
+                if tokens[0] == 'L':
+                    comp['lib'] = tokens[1].lstrip('~')
+                    comp['ref'] = tokens[2]
+                elif tokens[0] == 'U':
+                    comp['unit'] = int(tokens[1])
+                    comp['convert'] = int(tokens[2])
+                    comp['timestamp'] = tokens[3]
+                elif tokens[0] == 'P':
+                    comp['pos'] = (int(tokens[1]), int(tokens[2]))
+                elif tokens[0] == 'AR':
+                    ar = dict(t.split('=', 1) for t in re.findall(r'\w+="[^"]*"', line))
+                    ar = dict((k, v.strip('"')) for k, v in ar.items())
+                    comp['ar'][ar.get('Path')] = ar.get('Ref')
+                elif tokens[0] == 'F':
+                    num = int(tokens[1])
+                    if num == 1:
+                        comp['value'] = tokens[2]
+                    elif num >= 4 and len(tokens) > 10 and tokens[2]:
+                        comp['fields'][tokens[10]] = tokens[2]
+                elif len(tokens) == 4 and 'pos' in comp:
+                    # The orientation matrix is the second of the two bare
+                    # number lines at the end of the component.
+                    comp['matrix'] = tuple(int(t) for t in tokens)
+            sheet['components'].append(comp)
+
+        elif line.startswith('Wire Wire Line'):
+            x1, y1, x2, y2 = (int(t) for t in next(lines).split())
+            sheet['wires'].append((x1, y1, x2, y2))
+
+        elif line.startswith('Connection ~'):
+            t = line.split()
+            sheet['junctions'].append((int(t[2]), int(t[3])))
+
+        elif line.startswith('Text '):
+            t = line.split()
+            text = next(lines)
+            kind = {
+                'Label': NAME_LOCAL,
+                'GLabel': NAME_GLOBAL,
+                'HLabel': NAME_HIER,
+                }.get(t[1])
+            if kind is not None:
+                sheet['labels'].append((kind, text.strip(), int(t[2]), int(t[3])))
+
+        elif line.startswith('$Sheet'):
+            child = {'pins': []}
+            for line in lines:
+                if line.startswith('$EndSheet'):
+                    break
+                tokens = _split(line)
+                if not tokens:
+                    continue
+                if tokens[0] == 'U':
+                    child['timestamp'] = tokens[1]
+                elif tokens[0] == 'F0':
+                    child['name'] = tokens[1]
+                elif tokens[0] == 'F1':
+                    child['file'] = tokens[1]
+                elif re.match('F[0-9]+$', tokens[0]):
+                    child['pins'].append((tokens[1], int(tokens[4]), int(tokens[5])))
+            sheet['sheets'].append(child)
+
+    return sheet
+
+
+def _parse_all(function, filenames, jobs):
+    filenames = list(filenames)
+    if jobs == 1 or len(filenames) < 2:
+        return dict((f, function(f)) for f in filenames)
+
+    import multiprocessing
+    pool = multiprocessing.Pool(min(jobs or multiprocessing.cpu_count(), len(filenames)))
+    try:
+        return dict(zip(filenames, pool.map(function, filenames)))
+    finally:
+        pool.close()
+        pool.join()
+
+
+# ---------------------------------
+# Connectivity
+# ---------------------------------
+
+class _UnionFind(object):
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, x):
+        parent = self.parent
+        root = parent.setdefault(x, x)
+        while root != parent[root]:
+            root = parent[root]
+        while x != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def union(self, a, b):
+        a = self.find(a)
+        b = self.find(b)
+        if a != b:
+            self.parent[b] = a
+
+
+def _on_wire(x, y, wire):
+    x1, y1, x2, y2 = wire
+    if not (min(x1, x2) <= x <= max(x1, x2) and min(y1, y2) <= y <= max(y1, y2)):
+        return False
+    return (x2 - x1) * (y - y1) == (y2 - y1) * (x - x1)
+
+
+class _WireIndex(object):
+    """Wires of a sheet indexed by their x (vertical) or y (horizontal)."""
+
+    def __init__(self, wires):
+        self.wires = wires
+        self.vertical = {}
+        self.horizontal = {}
+        self.other = []
+        for w, (x1, y1, x2, y2) in enumerate(wires):
+            if x1 == x2:
+                self.vertical.setdefault(x1, []).append(w)
+            elif y1 == y2:
+                self.horizontal.setdefault(y1, []).append(w)
+            else:
+                self.other.append(w)
+
+    def at(self, x, y):
+        for w in self.vertical.get(x, []) + self.horizontal.get(y, []) + self.other:
+            if _on_wire(x, y, self.wires[w]):
+                yield w
+
+
+Instance = namedtuple("Instance", ["filename", "path", "tspath", "parent", "pins"])
+
+
+class SchematicReader(object):
+    def __init__(self, filename, libs=(), jobs=None):
+        self.root = os.path.abspath(filename)
+        self.extra_libs = list(libs)
+        self.jobs = jobs
+
+    def _lib_files(self, lib_names):
+        directory = os.path.dirname(self.root)
+        project = os.path.splitext(os.path.basename(self.root))[0]
+        files = list(self.extra_libs)
+        for name in lib_names:
+            path = os.path.join(directory, name + '.lib')
+            if os.path.exists(path):
+                files.append(path)
+        # The cache library has every symbol used, it is only used for symbols
+        # not found in the libraries listed by the schematic.
+        cache = os.path.join(directory, project + '-cache.lib')
+        if os.path.exists(cache):
+            files.append(cache)
+        return [f for i, f in enumerate(files) if f not in files[:i]]
+
+    def read(self):
+        # Walk the hierarchy one level at a time, parsing each level's new
+        # files in parallel.
+        sheets = {}
+        instances = [Instance(self.root, '/', '/', None, [])]
+        level = [0]
+        while level:
+            todo = set(instances[i].filename for i in level) - set(sheets)
+            sheets.update(_parse_all(parse_sheet_file, sorted(todo), self.jobs))
+
+            next_level = []
+            for i in level:
+                inst = instances[i]
+                directory = os.path.dirname(inst.filename)
+                for child in sheets[inst.filename]['sheets']:
+                    instances.append(Instance(
+                        filename=os.path.join(directory, child['file']),
+                        path=inst.path + child['name'] + '/',
+                        tspath=inst.tspath + child['timestamp'] + '/',
+                        parent=i,
+                        pins=child['pins'],
+                        ))
+                    next_level.append(len(instances) - 1)
+            level = next_level
+
+        libs = {}
+        lib_files = self._lib_files(sheets[self.root]['libs'])
+        parsed = _parse_all(parse_lib_file, lib_files, self.jobs)
+        for lib_file in lib_files:
+            for name, symbol in parsed[lib_file].items():
+                libs.setdefault(name, symbol)
+
+        return self._resolve(instances, sheets, libs)
+
+    def _resolve(self, instances, sheets, libs):
+        uf = _UnionFind()
+        names = {}
+        used_parts = {}
+        components = {}
+
+        indexes = dict((f, _WireIndex(sheet['wires'])) for f, sheet in sheets.items())
+
+        def connect(node, i, x, y):
+            uf.union(node, (i, x, y))
+            for w in indexes[instances[i].filename].at(x, y):
+                uf.union(node, (i, 'wire', w))
+
+        for i, inst in enumerate(instances):
+            sheet = sheets[inst.filename]
+            depth = inst.path.count('/')
+
+            for w, (x1, y1, x2, y2) in enumerate(sheet['wires']):
+                connect((i, 'wire', w), i, x1, y1)
+                connect((i, 'wire', w), i, x2, y2)
+
+            for x, y in sheet['junctions']:
+                connect((i, x, y), i, x, y)
+
+            for kind, text, x, y in sheet['labels']:
+                if kind == NAME_GLOBAL:
+                    node = ('global', text)
+                    name = text
+                elif kind == NAME_LOCAL:
+                    node = ('local', i, text)
+                    name = inst.path + text
+                else:
+                    node = ('hier', i, text)
+                    name = inst.path + text
+                connect(node, i, x, y)
+                names.setdefault(node, []).append((kind, depth, text, name))
+
+            # Sheet pins are in the parent, connect them to the child's
+            # hierarchical labels.
+            if inst.parent is not None:
+                for pinname, x, y in inst.pins:
+                    connect(('hier', i, pinname), inst.parent, x, y)
+
+            for comp in sheet['components']:
+                ref = comp['ar'].get(inst.tspath + comp.get('timestamp', ''), comp['ref'])
+                power, pins = libs.get(comp['lib'], (False, []))
+                if comp['lib'] not in libs:
+                    sys.stderr.write("Symbol %s for %s not found in libraries\n" % (comp['lib'], ref))
+
+                cx, cy = comp['pos']
+                x1, y1, x2, y2 = comp.get('matrix', (1, 0, 0, -1))
+                for num, pinname, px, py, unit, convert, type, hidden in pins:
+                    if unit and unit != comp.get('unit', 1):
+                        continue
+                    if convert and convert != comp.get('convert', 1):
+                        continue
+                    node = ('pin', ref, num)
+                    connect(node, i, cx + x1 * px + y1 * py, cy + x2 * px + y2 * py)
+                    if power or (hidden and type == 'power_in'):
+                        uf.union(node, ('global', pinname))
+                        names.setdefault(node, []).append((NAME_POWER, 0, pinname, pinname))
+
+                if ref.startswith('#'):
+                    continue
+
+                used_parts.setdefault(comp['lib'], pins)
+                if ref not in components:
+                    components[ref] = SchComponent(
+                        ref=ref,
+                        part=comp['lib'],
+                        value=comp.get('value', ''),
+                        fields=comp['fields'],
+                        )
+
+        # Group the component pins by the net they ended up on.
+        nets = {}
+        for ref, comp in components.items():
+            for pin in used_parts[comp.part]:
+                node = ('pin', ref, pin[0])
+                if node in uf.parent:
+                    nets.setdefault(uf.find(node), set()).add((ref, pin[0]))
+
+        candidates = {}
+        for node, node_names in names.items():
+            candidates.setdefault(uf.find(node), []).extend(node_names)
+
+        result = []
+        for root, nodes in nets.items():
+            if root in candidates:
+                name = min(candidates[root])[3]
+            else:
+                ref, pin = min(nodes)
+                name = "Net-(%s-Pad%s)" % (ref, pin)
+            result.append(SchNet(name=name, nodes=sorted(nodes)))
+        result.sort()
+
+        libparts = []
+        for name, pins in sorted(used_parts.items()):
+            seen = set()
+            part_pins = []
+            for num, pinname, _, _, _, _, type, _ in pins:
+                if num in seen:
+                    continue
+                seen.add(num)
+                part_pins.append(LibPin(num=num, name=pinname, type=type))
+            libparts.append(LibPart(name=name, pins=part_pins))
+
+        return Netlist(
+            libparts=libparts,
+            components=[components[ref] for ref in sorted(components)],
+            nets=result,
+            )
+
+
+def load(filename, libs=(), jobs=None):
+    return SchematicReader(filename, libs, jobs).read()
+
+
+if __name__ == "__main__":
+    netlist = load(sys.argv[1], libs=sys.argv[2:])
+    for net in netlist.nets:
+        print("%s: %s" % (net.name, " ".join("%s.%s" % n for n in net.nodes)))
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+"""
+Building a Schematic from an Eeschema exported netlist (.xml) or directly from
+the schematic (.sch).
+"""
+
+from . import kicad_sch
+from .schematic import Pin, Part, Component, Connection, Net, Schematic, Fields, ValueTable
+
+
+class _NetlistFields(object):
+    """Fields of a netlist component, only read from the node when needed.
+
+    The node is dropped once read, so a decoded component doesn't keep the
+    document alive.
+    """
+
+    __slots__ = ('node',)
+
+    def __init__(self, node):
+        self.node = node
+
+    def items(self):
+        node, self.node = self.node, None
+        return [(name, node.getField(name)) for name in node.getFieldNames()]
+
+
+def read_netlist(filename):
+    """Read an Eeschema exported netlist into the records kicad_sch builds."""
+    import kicad_netlist_reader
+    netfile = kicad_netlist_reader.netlist(filename)
+
+    libparts = []
+    for node in netfile.libparts:
+        pins = []
+        for child in node.element.getChildren():
+            if child.name != 'pins':
+                continue
+
+            for pinnode in child.getChildren():
+                pins.append(kicad_sch.LibPin(
+                    num=pinnode.attributes['num'],
+                    name=pinnode.attributes['name'],
+                    type=pinnode.attributes['type']))
+        libparts.append(kicad_sch.LibPart(name=node.getPartName(), pins=pins))
+
+    components = []
+    for node in netfile.getInterestingComponents():
+        components.append(kicad_sch.SchComponent(
+            ref=node.getRef(),
+            part=node.getPartName(),
+            value=node.getValue(),
+            fields=_NetlistFields(node),
+            ))
+
+    nets = []
+    for node in netfile.nets:
+        nets.append(kicad_sch.SchNet(
+            name=node.attributes['name'],
+            nodes=[(child.attributes['ref'], child.attributes['pin']) for child in node.getChildren()],
+            ))
+
+    return kicad_sch.Netlist(libparts=libparts, components=components, nets=nets)
+
+# ---------------------------------
+
+def build_schematic(netlist):
+    """Build the Schematic from the part / component / net records."""
+    schematic = Schematic()
+    table = ValueTable()
+
+    for libpart in netlist.libparts:
+        part = Part(name=libpart.name)
+        for pin in libpart.pins:
+            part.add_pin(
+                name=pin.num,
+                description=pin.name,
+                type=pin.type)
+
+        schematic.add_part(part)
+
+    for node in netlist.components:
+        component = Component(
+            name=node.ref,
+            part=table.string(node.part),
+            fields=Fields(node.value, node.fields.items, table),
+            )
+
+        schematic.add_component(component)
+
+    for node in netlist.nets:
+        new_net = Net(name=node.name)
+        for ref, pin in node.nodes:
+            new_net.add_connection(Connection(
+                component=ref,
+                pin=Pin.format_pin(pin)))
+
+        schematic.add_net(new_net)
+
+    return schematic
+
+
+def load_schematic(filename, libs=(), jobs=None):
+    """Schematic for an exported netlist (.xml) or a schematic (.sch)."""
+    if filename.endswith('.sch'):
+        return build_schematic(kicad_sch.load(filename, libs, jobs))
+    return build_schematic(read_netlist(filename))
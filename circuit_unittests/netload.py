@@ -0,0 +1,331 @@
+#!/usr/bin/env python
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+"""
+Electrical load summary of every connectivity net.
+
+For each (collapsed) net works out
+
+  pins                component pins on the net, including the passives
+  fanout              components on the net other than the one driving it
+  drivers/receivers   components with pins which can drive / receive (from
+                      the pin type)
+  receivers_per_driver  receivers the worst placed driver sees
+  series/shunts       passives joining nets / pulling the net to power
+  shunt_capacitance   total value of the capacitors to power (F)
+  speed               fastest class of the IO standards on the net
+
+The pins, pulls and series passives are collected into flat columns (read as
+arrays straight from a snapshot), the per net totals are then worked out with
+numpy. Nets
+going over the limits in RULES for their speed class are flagged.
+"""
+
+import sys
+
+from collections import namedtuple
+
+import numpy as np
+
+from .snapshot import NONE
+
+
+# Speed classes, fastest first, and the IO standards in each.
+SPEEDS = ['tmds', 'lvds', 'sstl', 'lvcmos', 'i2c']
+SPEED_IO_STANDARDS = {
+    'TMDS_33': 'tmds',
+    'LVDS_25': 'lvds',
+    'LVDS_33': 'lvds',
+    'LVDS33': 'lvds',
+    'DIFF_SSTL15_II': 'sstl',
+    'SSTL15_II': 'sstl',
+    'LVCMOS33': 'lvcmos',
+    'SDIO': 'lvcmos',
+    'I2C': 'i2c',
+}
+
+DRIVER_TYPES = ('output', 'BiDi', '3state', 'openCol', 'openEm')
+RECEIVER_TYPES = ('input', 'BiDi')
+
+Rule = namedtuple("Rule", ['fanout', 'receivers_per_driver', 'series', 'shunt_capacitance'])
+
+# Limits for each speed class, None for no limit.
+RULES = {
+    # Point to point through the ESD protection, nothing loading the pair.
+    'tmds': Rule(fanout=2, receivers_per_driver=2, series=0, shunt_capacitance=0),
+    'lvds': Rule(fanout=1, receivers_per_driver=1, series=1, shunt_capacitance=0),
+    # Fly-by to two DRAMs at most, terminated to VTT.
+    'sstl': Rule(fanout=2, receivers_per_driver=2, series=1, shunt_capacitance=0),
+    # Resets and hot plug detects have RC filters, so no capacitance limit.
+    'lvcmos': Rule(fanout=4, receivers_per_driver=4, series=2, shunt_capacitance=None),
+    'i2c': Rule(fanout=8, receivers_per_driver=8, series=2, shunt_capacitance=400e-12),
+}
+
+NetLoad = namedtuple("NetLoad", [
+    'net', 'pins', 'fanout', 'drivers', 'receivers', 'receivers_per_driver',
+    'series', 'shunts', 'shunt_capacitance', 'speed'])
+
+
+class NetLoads(object):
+    """Per net columns, net i of each column is self.nets[i]."""
+
+    columns = NetLoad._fields[1:-1]
+
+    def __init__(self, nets, speed, **columns):
+        self.nets = nets
+        # Index into SPEEDS, -1 for nets without an IO standard.
+        self.speed = speed
+        for name in self.columns:
+            setattr(self, name, columns[name])
+
+    def __len__(self):
+        return len(self.nets)
+
+    def __iter__(self):
+        for i, net in enumerate(self.nets):
+            yield self.row(i)
+
+    def row(self, i):
+        values = [getattr(self, name)[i].item() for name in self.columns]
+        speed = SPEEDS[self.speed[i]] if self.speed[i] >= 0 else None
+        return NetLoad(self.nets[i], *(values + [speed]))
+
+    def violations(self, rules=RULES):
+        """[(NetLoad, [problem, ...])] for the nets over their class limits."""
+        problems = np.zeros((len(self.nets), len(Rule._fields)), dtype=bool)
+        for speed, rule in rules.items():
+            on_class = self.speed == SPEEDS.index(speed)
+            for j, name in enumerate(Rule._fields):
+                limit = getattr(rule, name)
+                if limit is not None:
+                    problems[:, j] |= on_class & (getattr(self, name) > limit)
+
+        result = []
+        for i in np.flatnonzero(problems.any(axis=1)):
+            load = self.row(i)
+            rule = rules[load.speed]
+            result.append((load, [
+                "%s %s > %s" % (name, _fmt(getattr(load, name)), _fmt(getattr(rule, name)))
+                for j, name in enumerate(Rule._fields) if problems[i, j]]))
+        return result
+
+
+def _fmt(value):
+    if isinstance(value, float):
+        return "%g" % value
+    return str(value)
+
+
+def _capacitance(component):
+    if component.part != 'C':
+        return 0.0
+    value = component.fields.get('value')
+    if isinstance(value, float):
+        return value
+    return 0.0
+
+
+def _io_standard(part, pin):
+    """Part.io_standard(), None for the pins it doesn't know."""
+    try:
+        return part.io_standard(pin)
+    except AssertionError:
+        return None
+
+
+def _pin_info(part, pin):
+    """(drives, receives, speed index) of a part pin, len(SPEEDS) for pins
+    without an IO standard."""
+    pin_type = part.pins[pin].type
+    speed = SPEED_IO_STANDARDS.get(_io_standard(part, pin))
+    return (
+        pin_type in DRIVER_TYPES,
+        pin_type in RECEIVER_TYPES,
+        SPEEDS.index(speed) if speed else len(SPEEDS))
+
+
+# One entry per connection / pull / series passive. The *_net columns are
+# indexes into names, conn_pin into pins ((part name, pin)) and pull_via into
+# passives (component names). conn_component and series_via are only compared
+# with each other.
+_Columns = namedtuple("_Columns", [
+    'names', 'conn_net', 'conn_component', 'conn_pin', 'pins',
+    'series_net', 'series_via', 'pull_net', 'pull_via', 'passives'])
+
+
+def _schematic_columns(connectivity):
+    components = connectivity.components
+    names = sorted(connectivity.nets)
+
+    conn_net = []
+    conn_component = []
+    conn_pin = []
+    series_net = []
+    series_via = []
+    pull_net = []
+    pull_via = []
+
+    component_ids = {}
+    pin_ids = {}
+    passive_ids = {}
+    for i, name in enumerate(names):
+        net = connectivity.nets[name]
+        for c in net.connections:
+            conn_net.append(i)
+            conn_component.append(component_ids.setdefault(c.component, len(component_ids)))
+            conn_pin.append(pin_ids.setdefault((components[c.component].part, c.pin), len(pin_ids)))
+            if c.via:
+                series_net.append(i)
+                series_via.append(component_ids.setdefault(c.via[0], len(component_ids)))
+        for p in net.pulls:
+            pull_net.append(i)
+            pull_via.append(passive_ids.setdefault(p.via, len(passive_ids)))
+
+    def ordered(ids):
+        return [k for k, _ in sorted(ids.items(), key=lambda i: i[1])]
+
+    def array(column):
+        return np.array(column, dtype=np.int64)
+
+    return _Columns(
+        names, array(conn_net), array(conn_component), array(conn_pin), ordered(pin_ids),
+        array(series_net), array(series_via), array(pull_net), array(pull_via),
+        ordered(passive_ids))
+
+
+def _records(snapshot, tag, dtype, count=None):
+    section = snapshot.records(tag)
+    if count is None:
+        count = section.count
+    return np.frombuffer(
+        snapshot.buf, dtype=dtype, count=count * section.record.size // np.dtype(dtype).itemsize,
+        offset=section.offset).reshape(count, -1).astype(np.int64)
+
+
+def _snapshot_columns(snapshot):
+    nets = _records(snapshot, b'NETS', '<u4')
+    conns = _records(snapshot, b'CONN', '<u4', int(nets[:, 3].sum()))
+    pulls = _records(snapshot, b'PULL', '<u4', int(nets[:, 5].sum()))
+    comps = _records(snapshot, b'COMP', '<u4')
+
+    # The snapshot keeps the nets in their own order, renumber them to the
+    # sorted names.
+    names = list(snapshot.nets)
+    order = sorted(range(len(names)), key=names.__getitem__)
+    rank = np.empty(len(names), dtype=np.int64)
+    rank[order] = np.arange(len(names))
+    names = [names[i] for i in order]
+
+    # The records are stored net by net.
+    conn_net = rank[np.repeat(np.arange(len(nets)), nets[:, 3])]
+    pull_net = rank[np.repeat(np.arange(len(nets)), nets[:, 5])]
+
+    conn_component = conns[:, 0]
+    width = int(conns[:, 1].max()) + 1 if len(conns) else 1
+    pin_keys, conn_pin = np.unique(comps[conn_component, 1] * width + conns[:, 1], return_inverse=True)
+    pins = [(snapshot.string(k // width), snapshot.value(k % width)) for k in pin_keys.tolist()]
+
+    series = conns[:, 2] != NONE
+    passive_ids, pull_via = np.unique(pulls[:, 1], return_inverse=True)
+    passives = [snapshot.string(i) for i in passive_ids.tolist()]
+
+    return _Columns(
+        names, conn_net, conn_component, conn_pin.reshape(-1), pins,
+        conn_net[series], conns[series, 2], pull_net, pull_via.reshape(-1), passives)
+
+
+def net_loads(connectivity):
+    """NetLoads for the nets of a connectivity schematic or snapshot.
+
+    Snapshots have the connections and pulls read as arrays straight from the
+    file, for schematics they are collected in one pass over the nets. Either
+    way the pins are only classified once per part pin.
+    """
+    if hasattr(connectivity, 'records'):
+        columns = _snapshot_columns(connectivity)
+    else:
+        columns = _schematic_columns(connectivity)
+    names = columns.names
+
+    parts = connectivity.parts
+    components = connectivity.components
+    pin_info = np.array(
+        [_pin_info(parts[part], pin) for part, pin in columns.pins], dtype=np.int64).reshape(-1, 3)
+    capacitance = np.array(
+        [_capacitance(components[name]) for name in columns.passives], dtype=float)
+
+    pin_net = columns.conn_net
+    pin_component = columns.conn_component
+    pin_driver = pin_info[columns.conn_pin, 0]
+    pin_receiver = pin_info[columns.conn_pin, 1]
+    pin_speed = pin_info[columns.conn_pin, 2]
+    pull_net = columns.pull_net
+    pull_capacitance = capacitance[columns.pull_via]
+    series_net = columns.series_net
+    series_component = columns.series_via
+
+    count = len(names)
+
+    # Distinct (net, component) pairs, for the components on each net and the
+    # series passives (several connections can be through one passive).
+    width = int(max(pin_component.max() if len(pin_component) else 0,
+                    series_component.max() if len(series_component) else 0)) + 1
+    on_net, on_net_pin = np.unique(pin_net * width + pin_component, return_inverse=True)
+    on_net_pin = on_net_pin.reshape(-1)
+    on_net_net = on_net // width
+    series = np.unique(series_net * width + series_component) // width
+    series = np.bincount(series, minlength=count)
+
+    # Drivers and receivers are counted by component, a component with
+    # several pins on the net (a pass through ESD part) is one load.
+    drives = np.bincount(on_net_pin, weights=pin_driver, minlength=len(on_net)) > 0
+    receives = np.bincount(on_net_pin, weights=pin_receiver, minlength=len(on_net)) > 0
+    drivers = np.bincount(on_net_net, weights=drives, minlength=count).astype(np.int64)
+    receivers = np.bincount(on_net_net, weights=receives, minlength=count).astype(np.int64)
+    outputs = np.bincount(on_net_net, weights=drives & ~receives, minlength=count).astype(np.int64)
+    # An output only driver drives every receiver, a bidirectional one all
+    # but itself.
+    receivers_per_driver = np.where(
+        outputs > 0, receivers, np.where(drivers > 0, receivers - 1, 0))
+
+    terminals = np.bincount(pin_net, minlength=count)
+    shunts = np.bincount(pull_net, minlength=count)
+    shunt_capacitance = np.bincount(pull_net, weights=pull_capacitance, minlength=count)
+
+    speed = np.full(count, len(SPEEDS), dtype=np.int64)
+    np.minimum.at(speed, pin_net, pin_speed)
+    speed[speed == len(SPEEDS)] = -1
+
+    return NetLoads(
+        names, speed,
+        pins=terminals + 2 * series + shunts,
+        fanout=np.maximum(np.bincount(on_net_net, minlength=count) - 1, 0),
+        drivers=drivers,
+        receivers=receivers,
+        receivers_per_driver=receivers_per_driver,
+        series=series,
+        shunts=shunts,
+        shunt_capacitance=shunt_capacitance,
+        )
+
+
+def _net_str(name):
+    if isinstance(name, tuple):
+        return " / ".join(name)
+    return name
+
+
+def report(loads, out=sys.stdout, rules=RULES, show_all=False):
+    """Write the nets over their limits (or every net), returns the number of
+    nets over their limits."""
+    violations = loads.violations(rules)
+    if show_all:
+        out.write("# %s\n" % " ".join(NetLoad._fields))
+        for load in loads:
+            out.write("%s %d %d %d %d %d %d %d %g %s\n" % (
+                _net_str(load.net), load.pins, load.fanout, load.drivers, load.receivers,
+                load.receivers_per_driver, load.series, load.shunts,
+                load.shunt_capacitance, load.speed or '-'))
+    for load, problems in violations:
+        out.write("%s (%s): %s\n" % (_net_str(load.net), load.speed, ", ".join(problems)))
+    return len(violations)
@@ -0,0 +1,448 @@
+#!/usr/bin/env python
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+"""
+Bounded memory pin constraints for very large netlists.
+
+load2.py holds the netlist DOM, the schematic and the collapsed connectivity
+in memory at once. Here the netlist XML is streamed and the components and net
+nodes are written to disk backed sorted runs instead;
+
+ * component nodes are merge joined with the components (sorted by reference)
+   to split them into FPGA balls / other terminals, pulls to power and passive
+   edges between two nets,
+ * the nets joined by passives are grouped by propagating the smallest net
+   number along the edges until nothing changes (one pass over the sorted
+   edges per round, the number of rounds is the longest passive chain),
+ * the terminals, balls and pulls are sorted by group, then by component, to
+   produce the PinConstraint records, which are sorted into the same order
+   constraints.pin_constraints() uses and streamed to the writers.
+
+Only the parts (the library, not the board) and the current component / net /
+group are held in memory, everything else is in runs of at most run_size
+records. Merging the runs back together reads them in batches sized so the
+batches of all the runs merged at once are no more than run_size records, a
+smaller limit means more merge passes rather than more memory.
+"""
+
+import heapq
+import os
+import re
+import shutil
+import tempfile
+import xml.sax
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from . import constraints
+from .schematic import Pin, Part, Component, Fields, ValueTable, is_power_net, from_value
+
+
+# Rough size of a record in a run buffer (tuple, strings and sort key), used to
+# turn a memory limit into a run size.
+RECORD_SIZE = 256
+
+# Number of sorters buffering at the same time.
+BUFFERS = 4
+
+DEFAULT_MAX_MEMORY = 256
+
+
+def run_size(max_memory):
+    """Number of records per run for a memory limit in megabytes."""
+    return max(2, int(max_memory * 1024 * 1024 // (RECORD_SIZE * BUFFERS)))
+
+
+class ExternalSorter(object):
+    """Sorts more records than fit in memory.
+
+    Records are buffered until run_size of them are held, then sorted and
+    written to a temporary file as a run. Iterating merges the runs back
+    together, which can be done more than once. Records with equal keys come
+    out in the order they were added.
+
+    A merge holds one batch of each run it reads, the batch size and the
+    number of runs merged at once are picked so that is at most run_size
+    records. Runs over that are merged in several passes.
+    """
+
+    # Upper limits of the records per pickle in the run files and of the runs
+    # merged at once.
+    max_batch_size = 1024
+    max_fanin = 64
+
+    def __init__(self, workdir, run_size, key=None):
+        self.workdir = workdir
+        self.run_size = run_size
+        self.key = key or (lambda r: r)
+        self.batch_size = max(1, min(self.max_batch_size, run_size // 8))
+        self.fanin = max(2, min(self.max_fanin, run_size // self.batch_size))
+        self.merge_passes = 0
+        self._buf = []
+        self._runs = []
+        self._seq = 0
+
+    def add(self, record):
+        self._buf.append((self.key(record), self._seq, record))
+        self._seq += 1
+        if len(self._buf) >= self.run_size:
+            self._spill()
+
+    def __len__(self):
+        return self._seq
+
+    def _spill(self):
+        self._buf.sort()
+        self._runs.append(self._write_run(self._buf))
+        self._buf = []
+
+    def _write_run(self, records):
+        fd, filename = tempfile.mkstemp(dir=self.workdir, suffix='.run')
+        with os.fdopen(fd, 'wb') as f:
+            batch = []
+            for r in records:
+                batch.append(r)
+                if len(batch) >= self.batch_size:
+                    pickle.dump(batch, f, pickle.HIGHEST_PROTOCOL)
+                    batch = []
+            if batch:
+                pickle.dump(batch, f, pickle.HIGHEST_PROTOCOL)
+        return filename
+
+    @staticmethod
+    def _read_run(filename):
+        with open(filename, 'rb') as f:
+            while True:
+                try:
+                    batch = pickle.load(f)
+                except EOFError:
+                    return
+                for r in batch:
+                    yield r
+
+    def _merged(self, runs):
+        # The sequence number makes the keys unique, so heapq never has to
+        # compare the records themselves.
+        return heapq.merge(*[self._read_run(r) for r in runs])
+
+    def __iter__(self):
+        if not self._runs:
+            self._buf.sort()
+            for _, _, record in self._buf:
+                yield record
+            return
+
+        if self._buf:
+            self._spill()
+        while len(self._runs) > self.fanin:
+            runs = self._runs[:self.fanin]
+            self._runs = self._runs[self.fanin:] + [self._write_run(self._merged(runs))]
+            self.merge_passes += 1
+            for filename in runs:
+                os.unlink(filename)
+
+        for _, _, record in self._merged(self._runs):
+            yield record
+
+    def close(self):
+        for filename in self._runs:
+            os.unlink(filename)
+        self._runs = []
+        self._buf = []
+
+
+def _join(table, records, key):
+    """Pair each record with the table row with the same key (or None).
+
+    Both must be sorted by key, the key of a table row is row[0] and is unique.
+    """
+    table = iter(table)
+    row = next(table, None)
+    for record in records:
+        k = key(record)
+        while row is not None and row[0] < k:
+            row = next(table, None)
+        if row is not None and row[0] == k:
+            yield row, record
+        else:
+            yield None, record
+
+
+def _grouped(pairs, key):
+    """Group consecutive (row, record) pairs from _join by key(record)."""
+    current = None
+    group = []
+    for row, record in pairs:
+        k = key(record)
+        if group and k != current:
+            yield group[0][0], group
+            group = []
+        current = k
+        group.append((row, record))
+    if group:
+        yield group[0][0], group
+
+
+def _ref_key(ref):
+    """kicad_netlist_reader's natural sort order for references."""
+    return [int(t) if t.isdigit() else t.lower() for t in re.split('([0-9]+)', ref)]
+
+
+# ---------------------------------
+
+class _NetlistHandler(xml.sax.ContentHandler):
+    """Streams the components and net nodes of a netlist into the sorters.
+
+    components get (ref, part, value, [(field, value), ...]) records and nodes
+    get (ref, pin, net number, power net name or None) records.
+    """
+
+    def __init__(self, components, nodes):
+        xml.sax.ContentHandler.__init__(self)
+        self.components = components
+        self.nodes = nodes
+        self.parts = {}
+        self.fpga = None
+
+        self._path = []
+        self._chars = []
+        self._comp = None
+        self._field = None
+        self._libpart = None
+        self._net = None
+        self._nets = 0
+
+    def startElement(self, name, attrs):
+        parent = self._path[-1] if self._path else None
+        self._path.append(name)
+        self._chars = []
+
+        if name == 'comp' and parent == 'components':
+            self._comp = {'ref': attrs['ref'], 'part': None, 'value': None, 'fields': []}
+        elif self._comp is not None:
+            if name == 'libsource':
+                self._comp['part'] = attrs['part']
+            elif name == 'field':
+                self._field = attrs['name']
+
+        elif name == 'libpart' and parent == 'libparts':
+            self._libpart = Part(attrs['part'])
+        elif name == 'pin' and self._libpart is not None and parent == 'pins':
+            self._libpart.add_pin(name=attrs['num'], description=attrs['name'], type=attrs['type'])
+
+        elif name == 'net' and parent == 'nets':
+            self._nets += 1
+            self._net = (self._nets, is_power_net(attrs['name']) and attrs['name'])
+        elif name == 'node' and self._net is not None:
+            net, power = self._net
+            self.nodes.add((attrs['ref'], Pin.format_pin(attrs['pin']), net, power))
+
+    def characters(self, content):
+        self._chars.append(content)
+
+    def endElement(self, name):
+        self._path.pop()
+        if self._comp is not None:
+            if name == 'value':
+                self._comp['value'] = ''.join(self._chars)
+            elif name == 'field':
+                self._comp['fields'].append((self._field, ''.join(self._chars)))
+            elif name == 'comp':
+                comp = self._comp
+                self.components.add((comp['ref'], comp['part'], comp['value'], comp['fields']))
+                if comp['part'] and comp['part'].startswith('XC6SLX'):
+                    if self.fpga is None or _ref_key(comp['ref']) < _ref_key(self.fpga):
+                        self.fpga = comp['ref']
+                self._comp = None
+        elif name == 'libpart' and self._libpart is not None:
+            self.parts[self._libpart.name] = self._libpart
+            self._libpart = None
+        elif name == 'net':
+            self._net = None
+        self._chars = []
+
+
+def _component(table, ref, part, value, fields):
+    return Component(name=ref, part=part, fields=Fields(value, lambda: fields, table))
+
+
+# Kinds of the records sorted by group, balls and pulls come before the
+# terminals which need them.
+_BALL, _PULL, _TERMINAL = 0, 1, 2
+
+
+def _split_nodes(parts, fpga, components, nodes, edges, terminals):
+    """Join the nodes with their components.
+
+    Passive pins become an edge between two nets (in both directions, as each
+    pin is seen) or a pull when the other pin is on a power net, the other
+    pins on signal nets are terminals (or balls for the FPGA).
+    """
+    for comp, group in _grouped(_join(components, nodes, key=lambda n: n[0]), key=lambda n: n[0]):
+        if comp is None:
+            continue
+        ref, partname, value, _ = comp
+        part = parts[partname]
+        pins2net = dict((pin, (net, power)) for _, (_, pin, net, power) in group)
+
+        for pin, (net, power) in pins2net.items():
+            if power:
+                continue
+
+            other_pin = part.connected_pin(pin)
+            if not other_pin:
+                if ref == fpga:
+                    terminals.add((net, _BALL, constraints.pin_key(pin), pin))
+                else:
+                    terminals.add((net, _TERMINAL, ref, pin))
+                continue
+
+            if other_pin not in pins2net:
+                continue
+            other_net, other_power = pins2net[other_pin]
+            if other_power:
+                if partname == 'R':
+                    pull = constraints.pull_constraint(
+                        other_power, ref, from_value(value) if value else None)
+                    terminals.add((net, _PULL, (ref, other_power), pull))
+            else:
+                edges.add((net, other_net))
+
+
+def _propagate_labels(edges, new_sorter):
+    """Label each net joined by passives with the smallest net number in its
+    group, by passing labels along the edges until they stop changing.
+
+    Returns a sorter of (net, label) for the nets with edges, nets without
+    edges are their own group.
+    """
+    labels = new_sorter(key=lambda l: l[0])
+    last = None
+    for src, _ in edges:
+        if src != last:
+            labels.add((src, src))
+            last = src
+
+    changed = True
+    while changed:
+        changed = False
+        messages = new_sorter(key=lambda m: m[0])
+        for row, (src, dst) in _join(labels, edges, key=lambda e: e[0]):
+            messages.add((dst, row[1]))
+
+        new_labels = new_sorter(key=lambda l: l[0])
+        for row, group in _grouped(_join(labels, messages, key=lambda m: m[0]), key=lambda m: m[0]):
+            net, label = row
+            best = min(label, min(m[1] for _, m in group))
+            if best != label:
+                changed = True
+            new_labels.add((net, best))
+
+        messages.close()
+        labels.close()
+        labels = new_labels
+
+    return labels
+
+
+def _group_records(labels, terminals, grouped):
+    """Relabel the terminal / ball / pull records with their net's group."""
+    for row, (net, kind, key, value) in _join(labels, terminals, key=lambda t: t[0]):
+        group = row[1] if row is not None else net
+        grouped.add((group, kind, key, value))
+
+
+def _pin_records(grouped, pins):
+    """(ref, pin, balls, pulls) for every terminal in a group with FPGA balls."""
+    group = None
+    balls = []
+    pulls = []
+    for net, kind, key, value in grouped:
+        if net != group:
+            group = net
+            balls = []
+            pulls = []
+
+        if kind == _BALL:
+            balls.append(value)
+        elif kind == _PULL:
+            if not pulls or pulls[-1].via != value.via or pulls[-1].to != value.to:
+                pulls.append(value)
+        elif balls:
+            ref, pin = key, value
+            pins.add((ref, pin, tuple(balls), tuple(pulls)))
+
+
+def _component_constraints(parts, fpga, components, pins, ordered):
+    """PinConstraint records for each component, into ordered by component_key()."""
+    table = ValueTable()
+    for comp, group in _grouped(_join(components, pins, key=lambda p: p[0]), key=lambda p: p[0]):
+        if comp is None:
+            continue
+        component = _component(table, *comp)
+        key = constraints.component_key(component, fpga)
+        if key is None:
+            continue
+
+        part = parts[component.part]
+        by_pin = dict((pin, (balls, pulls)) for _, (_, pin, balls, pulls) in group)
+        for pin in constraints.component_pins(part, component):
+            if pin.name not in by_pin:
+                continue
+            balls, pulls = by_pin[pin.name]
+            for c in constraints.constraints_for_pin(part, component, pin.name, balls, pulls):
+                ordered.add((key, c))
+
+
+def pin_constraints(filename, max_memory=DEFAULT_MAX_MEMORY, tmpdir=None):
+    """Stream the PinConstraint records for an Eeschema exported netlist, in
+    the same order as constraints.pin_constraints() gives them for the
+    connectivity built by load2.py.
+
+    max_memory (in megabytes) bounds the records held in memory, the runs go in
+    a temporary directory under tmpdir which is removed when done.
+    """
+    workdir = tempfile.mkdtemp(prefix='outofcore-', dir=tmpdir)
+    size = run_size(max_memory)
+
+    def new_sorter(key=None):
+        return ExternalSorter(workdir, size, key)
+
+    try:
+        components = new_sorter(key=lambda c: c[0])
+        nodes = new_sorter(key=lambda n: n[0])
+        handler = _NetlistHandler(components, nodes)
+        xml.sax.parse(filename, handler)
+        parts = handler.parts
+        fpga = handler.fpga
+
+        edges = new_sorter(key=lambda e: e)
+        terminals = new_sorter(key=lambda t: t[0])
+        _split_nodes(parts, fpga, components, nodes, edges, terminals)
+        nodes.close()
+
+        labels = _propagate_labels(edges, new_sorter)
+        edges.close()
+
+        grouped = new_sorter(key=lambda g: g[:3])
+        _group_records(labels, terminals, grouped)
+        terminals.close()
+        labels.close()
+
+        pins = new_sorter(key=lambda p: p[0])
+        _pin_records(grouped, pins)
+        grouped.close()
+
+        ordered = new_sorter(key=lambda o: o[0])
+        _component_constraints(parts, fpga, components, pins, ordered)
+        pins.close()
+        components.close()
+
+        for _, c in ordered:
+            yield c
+        ordered.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
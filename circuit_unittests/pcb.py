@@ -0,0 +1,356 @@
+#!/usr/bin/env python
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+"""
+PCB checks which work on the track segments of a KiCad .kicad_pcb file.
+
+Comparing every segment against every other segment doesn't scale, so the
+segments are put into a uniform grid per copper layer. Each cell only holds the
+segments whose (width expanded) bounding box touches it, which makes "what is
+within distance d of this segment on the same layer" a lookup of a handful of
+cells.
+"""
+
+import math
+import re
+import sys
+
+from collections import namedtuple
+
+
+# ---------------------------------
+# .kicad_pcb s-expression reader
+# ---------------------------------
+
+_TOKEN_RE = re.compile(r'\(|\)|"(?:[^"\\]|\\.)*"|[^\s()]+')
+
+
+def parse_sexp(data):
+    stack = [[]]
+    for match in _TOKEN_RE.finditer(data):
+        token = match.group(0)
+        if token == '(':
+            stack.append([])
+        elif token == ')':
+            node = stack.pop()
+            stack[-1].append(node)
+        elif token.startswith('"'):
+            stack[-1].append(token[1:-1].replace('\\"', '"'))
+        else:
+            stack[-1].append(token)
+    assert len(stack) == 1, "Unbalanced s-expression"
+    return stack[0]
+
+
+def _children(node, name):
+    for child in node:
+        if isinstance(child, list) and child and child[0] == name:
+            yield child
+
+
+def _child(node, name):
+    for child in _children(node, name):
+        return child
+    return None
+
+
+# ---------------------------------
+
+Point = namedtuple("Point", ["x", "y"])
+
+
+SegmentBase = namedtuple("Segment", ["start", "end", "width", "layer", "net"])
+class Segment(SegmentBase):
+    @property
+    def length(self):
+        return math.hypot(self.end.x - self.start.x, self.end.y - self.start.y)
+
+    def bbox(self, expand=0.0):
+        e = self.width / 2.0 + expand
+        return (
+            min(self.start.x, self.end.x) - e,
+            min(self.start.y, self.end.y) - e,
+            max(self.start.x, self.end.x) + e,
+            max(self.start.y, self.end.y) + e,
+            )
+
+    def distance(self, other):
+        """Edge to edge distance between two tracks (0 if they touch)."""
+        d = segment_distance(self.start, self.end, other.start, other.end)
+        return max(0.0, d - self.width / 2.0 - other.width / 2.0)
+
+
+def _point_segment_distance(p, a, b):
+    dx = b.x - a.x
+    dy = b.y - a.y
+    l2 = dx * dx + dy * dy
+    if l2 == 0:
+        return math.hypot(p.x - a.x, p.y - a.y)
+    t = float((p.x - a.x) * dx + (p.y - a.y) * dy) / l2
+    t = max(0.0, min(1.0, t))
+    return math.hypot(p.x - (a.x + t * dx), p.y - (a.y + t * dy))
+
+
+def _cross(o, a, b):
+    return (a.x - o.x) * (b.y - o.y) - (a.y - o.y) * (b.x - o.x)
+
+
+def segment_distance(a1, a2, b1, b2):
+    """Distance between the centre lines of two segments."""
+    d1 = _cross(a1, a2, b1)
+    d2 = _cross(a1, a2, b2)
+    d3 = _cross(b1, b2, a1)
+    d4 = _cross(b1, b2, a2)
+    if ((d1 > 0) != (d2 > 0)) and ((d3 > 0) != (d4 > 0)) and d1 and d2 and d3 and d4:
+        return 0.0
+    return min(
+        _point_segment_distance(a1, b1, b2),
+        _point_segment_distance(a2, b1, b2),
+        _point_segment_distance(b1, a1, a2),
+        _point_segment_distance(b2, a1, a2),
+        )
+
+
+class PCB(object):
+    def __init__(self):
+        self.nets = {}
+        self.segments = []
+        self.clearances = {}
+        self.default_clearance = None
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename) as f:
+            tree = parse_sexp(f.read())
+        assert tree and tree[0][0] == 'kicad_pcb', "Not a kicad_pcb file"
+        return cls.from_sexp(tree[0])
+
+    @classmethod
+    def from_sexp(cls, root):
+        pcb = cls()
+        for node in _children(root, 'net'):
+            pcb.nets[int(node[1])] = node[2] if len(node) > 2 else ""
+
+        for node in _children(root, 'net_class'):
+            clearance = _child(node, 'clearance')
+            if clearance is None:
+                continue
+            clearance = float(clearance[1])
+            if node[1] == 'Default':
+                pcb.default_clearance = clearance
+            for add_net in _children(node, 'add_net'):
+                pcb.clearances[add_net[1]] = clearance
+
+        for node in _children(root, 'segment'):
+            start = _child(node, 'start')
+            end = _child(node, 'end')
+            pcb.segments.append(Segment(
+                start=Point(float(start[1]), float(start[2])),
+                end=Point(float(end[1]), float(end[2])),
+                width=float(_child(node, 'width')[1]),
+                layer=_child(node, 'layer')[1],
+                net=pcb.nets.get(int(_child(node, 'net')[1]), ""),
+                ))
+        return pcb
+
+    def clearance(self, netname):
+        return self.clearances.get(netname, self.default_clearance or 0.0)
+
+    def net_segments(self, netname):
+        return [i for i, s in enumerate(self.segments) if s.net == netname]
+
+
+class SegmentGrid(object):
+    """Uniform grid of segment indexes, one grid per layer."""
+
+    def __init__(self, segments, cell_size=None, expand=0.0):
+        self.segments = segments
+        self.expand = expand
+        if cell_size is None:
+            cell_size = self._guess_cell_size(segments)
+        self.cell_size = cell_size
+        self.layers = {}
+
+        for i, segment in enumerate(segments):
+            cells = self.layers.setdefault(segment.layer, {})
+            for cell in self._cells(segment.bbox(expand)):
+                cells.setdefault(cell, []).append(i)
+
+    @staticmethod
+    def _guess_cell_size(segments):
+        # Segments are short compared to the board, so the median length gives
+        # a cell which holds a few segments without each segment spanning many
+        # cells.
+        lengths = sorted(s.length + s.width for s in segments)
+        if not lengths:
+            return 1.0
+        return max(lengths[len(lengths) // 2], 0.1)
+
+    def _cells(self, bbox):
+        x0, y0, x1, y1 = bbox
+        c = self.cell_size
+        for ix in range(int(math.floor(x0 / c)), int(math.floor(x1 / c)) + 1):
+            for iy in range(int(math.floor(y0 / c)), int(math.floor(y1 / c)) + 1):
+                yield (ix, iy)
+
+    def candidates(self, segment, distance):
+        """Indexes of segments on the same layer whose cells are near."""
+        cells = self.layers.get(segment.layer, {})
+        found = set()
+        for cell in self._cells(segment.bbox(distance)):
+            found.update(cells.get(cell, ()))
+        return found
+
+    def near(self, segment, distance):
+        """Indexes of segments on the same layer within distance (edge to edge)."""
+        for i in self.candidates(segment, distance):
+            other = self.segments[i]
+            if other is segment:
+                continue
+            if segment.distance(other) <= distance:
+                yield i
+
+
+# ---------------------------------
+# Checks
+# ---------------------------------
+
+DIFF_PAIR_RE = re.compile(r'^(.*?)(_[PN]|[+-])$', re.IGNORECASE)
+
+
+def diff_pairs(netnames):
+    """Find XXX_P / XXX_N net pairs."""
+    halves = {}
+    for netname in netnames:
+        match = DIFF_PAIR_RE.match(netname)
+        if not match:
+            continue
+        base, suffix = match.groups()
+        positive = suffix.upper() in ('_P', '+')
+        halves.setdefault((base, len(suffix)), [None, None])[not positive] = netname
+
+    pairs = []
+    for p, n in halves.values():
+        if p and n:
+            pairs.append((p, n))
+    pairs.sort()
+    return pairs
+
+
+def _coupled_length(pcb, grid, segment_ids, other_net, gap, min_cos):
+    coupled = 0.0
+    for i in segment_ids:
+        s = pcb.segments[i]
+        length = s.length
+        if not length:
+            continue
+        ux = (s.end.x - s.start.x) / length
+        uy = (s.end.y - s.start.y) / length
+
+        intervals = []
+        for j in grid.near(s, gap):
+            t = pcb.segments[j]
+            if t.net != other_net or not t.length:
+                continue
+            cos = abs(ux * (t.end.x - t.start.x) + uy * (t.end.y - t.start.y)) / t.length
+            if cos < min_cos:
+                continue
+            a = (t.start.x - s.start.x) * ux + (t.start.y - s.start.y) * uy
+            b = (t.end.x - s.start.x) * ux + (t.end.y - s.start.y) * uy
+            a, b = max(0.0, min(a, b)), min(length, max(a, b))
+            if b > a:
+                intervals.append((a, b))
+
+        intervals.sort()
+        end = 0.0
+        for a, b in intervals:
+            if b <= end:
+                continue
+            coupled += b - max(a, end)
+            end = b
+    return coupled
+
+
+CoupledPair = namedtuple("CoupledPair", ["p", "n", "length", "coupled", "ratio"])
+
+
+def coupled_pairs(pcb, grid=None, gap=None, min_cos=0.95):
+    """How much of each _P/_N pair runs together.
+
+    A piece of track counts as coupled when a roughly parallel track of the
+    other half of the pair is within `gap` of it on the same layer. The gap
+    defaults to twice the pair's clearance.
+    """
+    if grid is None:
+        grid = SegmentGrid(pcb.segments)
+
+    by_net = {}
+    for i, s in enumerate(pcb.segments):
+        by_net.setdefault(s.net, []).append(i)
+
+    results = []
+    for p, n in diff_pairs(by_net.keys()):
+        pair_gap = gap
+        if pair_gap is None:
+            pair_gap = 2 * max(pcb.clearance(p), pcb.clearance(n))
+
+        length = sum(pcb.segments[i].length for i in by_net[p] + by_net[n])
+        coupled = (
+            _coupled_length(pcb, grid, by_net[p], n, pair_gap, min_cos) +
+            _coupled_length(pcb, grid, by_net[n], p, pair_gap, min_cos))
+        ratio = coupled / length if length else 0.0
+        results.append(CoupledPair(p, n, length, coupled, ratio))
+    return results
+
+
+SpacingViolation = namedtuple("SpacingViolation", ["a", "b", "layer", "distance", "required"])
+
+
+def spacing_violations(pcb, grid=None):
+    """Tracks of different nets closer than the larger of their clearances."""
+    if grid is None:
+        grid = SegmentGrid(pcb.segments)
+
+    max_clearance = max([pcb.clearance(s.net) for s in pcb.segments] or [0.0])
+
+    violations = []
+    for i, s in enumerate(pcb.segments):
+        for j in grid.near(s, max_clearance):
+            if j <= i:
+                continue
+            t = pcb.segments[j]
+            if t.net == s.net:
+                continue
+            required = max(pcb.clearance(s.net), pcb.clearance(t.net))
+            distance = s.distance(t)
+            if distance < required:
+                violations.append(SpacingViolation(i, j, s.layer, distance, required))
+    return violations
+
+
+def report(pcb, out=sys.stdout):
+    """Write the coupling of the pairs and the spacing violations, returns the
+    number of problems (pairs not coupled for the majority of their length and
+    spacing violations)."""
+    grid = SegmentGrid(pcb.segments)
+
+    problems = 0
+    for pair in coupled_pairs(pcb, grid):
+        flag = ""
+        if pair.ratio <= 0.5:
+            flag = "  <-- not coupled for the majority of its length"
+            problems += 1
+        out.write("{0} / {1}: {2:.1f}% of {3:.2f}mm coupled{4}\n".format(
+            pair.p, pair.n, pair.ratio * 100, pair.length, flag))
+
+    violations = spacing_violations(pcb, grid)
+    for v in violations:
+        a = pcb.segments[v.a]
+        b = pcb.segments[v.b]
+        out.write("Spacing {0} - {1} on {2}: {3:.3f}mm < {4:.3f}mm at ({5}, {6})\n".format(
+            a.net, b.net, v.layer, v.distance, v.required, a.start.x, a.start.y))
+    return problems + len(violations)
+
+
+if __name__ == "__main__":
+    sys.exit(1 if report(PCB.load(sys.argv[1])) else 0)
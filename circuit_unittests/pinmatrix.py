@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+"""
+Component pin to component pin connectivity as a sparse (CSR) matrix.
+
+Every component pin on a connectivity net (so not the passives joining the
+nets, or the power nets) gets a row and a column. The pins are ordered by
+component then pin, so the pins of a component are a contiguous range and the
+pin map between any two components (connector -> FPGA, PHY -> FPGA, ...) is a
+slice of the matrix.
+
+Each stored entry is a set of label bits; CONNECTED is always set, VIA when the
+two pins are on different nets joined through series passives and PULLED when
+the net is pulled to power.
+
+The matrix is built in one pass over the nets, with the rows filled in with
+numpy, and can be saved to / loaded from a .npz file.
+"""
+
+import numpy as np
+
+from .constraints import pin_key, pin_str
+from .schematic import Pin
+
+
+CONNECTED = 1
+VIA = 2
+PULLED = 4
+
+
+class PinMatrix(object):
+    def __init__(self, components, pin_component, pins, indptr, indices, data):
+        self.components = list(components)
+        self.pin_component = np.asarray(pin_component)
+        self.pins = list(pins)
+        self.indptr = np.asarray(indptr)
+        self.indices = np.asarray(indices)
+        self.data = np.asarray(data)
+
+        self._component_index = dict((name, i) for i, name in enumerate(self.components))
+        self._starts = np.searchsorted(self.pin_component, np.arange(len(self.components) + 1))
+
+    @property
+    def shape(self):
+        return (len(self.pins), len(self.pins))
+
+    @property
+    def nnz(self):
+        return len(self.indices)
+
+    def pin_range(self, component):
+        """(first, last + 1) row of the component's pins."""
+        i = self._component_index[component]
+        return int(self._starts[i]), int(self._starts[i + 1])
+
+    def pin_index(self, component, pin):
+        start, end = self.pin_range(component)
+        for i in range(start, end):
+            if self.pins[i] == pin:
+                return i
+        raise KeyError((component, pin))
+
+    def connected(self, component, pin):
+        """[(component, pin, labels)] reached from a component pin."""
+        i = self.pin_index(component, pin)
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return [
+            (self.components[self.pin_component[j]], self.pins[j], int(label))
+            for j, label in zip(self.indices[start:end], self.data[start:end])]
+
+    def between(self, a, b):
+        """[(pin of a, pin of b, labels)] for the pins of component a connected
+        to pins of component b."""
+        a_start, a_end = self.pin_range(a)
+        b_start, b_end = self.pin_range(b)
+        result = []
+        for i in range(a_start, a_end):
+            start, end = self.indptr[i], self.indptr[i + 1]
+            cols = self.indices[start:end]
+            lo, hi = np.searchsorted(cols, [b_start, b_end])
+            for j, label in zip(cols[lo:hi], self.data[start + lo:start + hi]):
+                result.append((self.pins[i], self.pins[j], int(label)))
+        return result
+
+    def submatrix(self, a, b):
+        """Dense array of the labels between the pins of a (rows) and b."""
+        a_start, a_end = self.pin_range(a)
+        b_start, b_end = self.pin_range(b)
+        dense = np.zeros((a_end - a_start, b_end - b_start), dtype=self.data.dtype)
+        rows = np.repeat(np.arange(a_end - a_start), np.diff(self.indptr[a_start:a_end + 1]))
+        cols = self.indices[self.indptr[a_start]:self.indptr[a_end]]
+        data = self.data[self.indptr[a_start]:self.indptr[a_end]]
+        mask = (cols >= b_start) & (cols < b_end)
+        dense[rows[mask], cols[mask] - b_start] = data[mask]
+        return dense
+
+    def save(self, filename):
+        np.savez_compressed(
+            filename,
+            components=np.array(self.components),
+            pin_component=self.pin_component,
+            pins=np.array([pin_str(p) for p in self.pins]),
+            indptr=self.indptr,
+            indices=self.indices,
+            data=self.data,
+            )
+
+    @classmethod
+    def load(cls, filename):
+        f = np.load(filename)
+        return cls(
+            [str(c) for c in f['components']],
+            f['pin_component'],
+            [Pin.format_pin(str(p)) for p in f['pins']],
+            f['indptr'],
+            f['indices'],
+            f['data'],
+            )
+
+
+def build_pin_matrix(connectivity):
+    """PinMatrix for a connectivity (collapsed) schematic or snapshot."""
+    components = sorted(connectivity.components2nets)
+
+    pins = []
+    pin_component = []
+    pin_net = []
+    pin_origin = []
+    net_ids = {}
+    net_pulled = []
+    origins = {}
+    origin_ids = {}
+
+    for ci, name in enumerate(components):
+        pins2net = connectivity.components2nets[name]
+        for pin in sorted(pins2net, key=pin_key):
+            netname = pins2net[pin]
+            if netname not in net_ids:
+                # First time the net is seen, note the net each connection
+                # started on (None for the net itself).
+                net = connectivity.nets[netname]
+                net_ids[netname] = len(net_pulled)
+                net_pulled.append(bool(net.pulls))
+                for c in net.connections:
+                    origins[(c.component, c.pin)] = (netname, c.via[1] if c.via else None)
+
+            origin = origins.pop((name, pin), (netname, None))
+            pins.append(pin)
+            pin_component.append(ci)
+            pin_net.append(net_ids[netname])
+            pin_origin.append(origin_ids.setdefault(origin, len(origin_ids)))
+
+    pin_component = np.array(pin_component, dtype=np.int32)
+    pin_net = np.array(pin_net, dtype=np.int64)
+    pin_origin = np.array(pin_origin, dtype=np.int64)
+    net_pulled = np.array(net_pulled, dtype=bool)
+    n = len(pins)
+
+    # In net order the pins of each net are contiguous, so each row is the
+    # range of its net (less the pin itself) mapped back to pin order.
+    order = np.argsort(pin_net, kind='mergesort')
+    counts = np.bincount(pin_net, minlength=len(net_pulled))
+    net_start = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    row_len = counts[pin_net]
+    row_start = np.concatenate(([0], np.cumsum(row_len)[:-1]))
+
+    rows = np.repeat(np.arange(n), row_len)
+    positions = np.arange(int(row_len.sum())) - row_start[rows] + net_start[pin_net][rows]
+    cols = order[positions]
+
+    keep = cols != rows
+    rows = rows[keep]
+    cols = cols[keep]
+    sort = np.lexsort((cols, rows))
+    rows = rows[sort]
+    cols = cols[sort]
+
+    data = np.full(len(cols), CONNECTED, dtype=np.uint8)
+    data[pin_origin[rows] != pin_origin[cols]] |= VIA
+    data[net_pulled[pin_net[rows]]] |= PULLED
+
+    indptr = np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=n))))
+    return PinMatrix(components, pin_component, pins, indptr, cols.astype(np.int32), data)
@@ -0,0 +1,293 @@
+#!/usr/bin/env python
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+"""
+Streaming check runner.
+
+Runs the check units (a check on one component) cheapest first, using the
+times recorded on previous runs, and writes each result as soon as it is
+known as text, TAP, JUnit XML or JSON Lines.
+
+Each unit can be given a wall clock budget, as can the whole run. The budgets
+are enforced with SIGALRM (signal.setitimer), a unit which runs over is
+interrupted and reported as timed out. Once the overall budget is used up, or
+with fail_fast after the first failure, the remaining units are reported as
+skipped without being run.
+"""
+
+import json
+import os
+import signal
+import tempfile
+import time
+
+from collections import namedtuple
+from xml.sax.saxutils import escape, quoteattr
+
+from . import checks
+
+
+PASS = 'pass'
+FAIL = 'fail'
+ERROR = 'error'
+TIMEOUT = 'timeout'
+SKIP = 'skip'
+
+Result = namedtuple("Result", ['check', 'scope', 'status', 'problems', 'cached', 'duration', 'message'])
+
+
+class CheckTimeout(Exception):
+    pass
+
+
+class Timings(object):
+    """Past run times of each check unit, kept in a JSON file.
+
+    The time kept is a moving average, so one slow run doesn't move a check to
+    the end for good. Units never timed sort first, which gets them timed.
+    """
+
+    weight = 0.5
+
+    def __init__(self, filename=None):
+        self.filename = filename
+        self.times = {}
+        if filename and os.path.exists(filename):
+            try:
+                with open(filename) as f:
+                    self.times = json.load(f)
+            except ValueError:
+                pass
+
+    @staticmethod
+    def key(check, scope):
+        return "%s %s" % (check, scope or '')
+
+    def get(self, check, scope):
+        return self.times.get(self.key(check, scope), 0.0)
+
+    def record(self, check, scope, duration):
+        key = self.key(check, scope)
+        if key in self.times:
+            duration = self.weight * duration + (1 - self.weight) * self.times[key]
+        self.times[key] = duration
+
+    def save(self):
+        if not self.filename:
+            return
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        fd, tmpname = tempfile.mkstemp(dir=directory, prefix='.timings-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.times, f, indent=1, sort_keys=True)
+            getattr(os, 'replace', os.rename)(tmpname, self.filename)
+        except Exception:
+            os.unlink(tmpname)
+            raise
+
+
+def _timeout(signum, frame):
+    raise CheckTimeout()
+
+
+def _alarm(seconds):
+    if seconds is not None:
+        signal.setitimer(signal.ITIMER_REAL, max(seconds, 0.001))
+
+
+def _cancel_alarm():
+    signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+def run(units, cache=None, timings=None, check_budget=None, budget=None, fail_fast=False):
+    """Run the units cheapest first, yielding a Result as each finishes.
+
+    check_budget and budget are in seconds, for each unit and for the whole
+    run. The timings are updated with the units run (not the cached ones) and
+    saved at the end.
+    """
+    if timings is None:
+        timings = Timings()
+    units = sorted(units, key=lambda u: timings.get(u.check.name, u.scope))
+
+    use_alarm = (check_budget is not None or budget is not None) and hasattr(signal, 'setitimer')
+    if use_alarm:
+        previous = signal.signal(signal.SIGALRM, _timeout)
+
+    deadline = None
+    if budget is not None:
+        deadline = time.time() + budget
+    stop = None
+    try:
+        for unit in units:
+            name = unit.check.name
+            if stop is None and deadline is not None and time.time() >= deadline:
+                stop = "overall budget of %ss used up" % budget
+            if stop is not None:
+                yield Result(name, unit.scope, SKIP, [], False, 0.0, stop)
+                continue
+
+            limit = check_budget
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if limit is None or remaining < limit:
+                    limit = remaining
+
+            start = time.time()
+            try:
+                if use_alarm:
+                    _alarm(limit)
+                try:
+                    r = checks.run_unit(unit, cache)
+                finally:
+                    if use_alarm:
+                        _cancel_alarm()
+            except CheckTimeout:
+                result = Result(name, unit.scope, TIMEOUT, [], False, time.time() - start,
+                                "took longer than %.3fs" % limit)
+            except Exception as e:
+                result = Result(name, unit.scope, ERROR, [], False, time.time() - start,
+                                "%s: %s" % (type(e).__name__, e))
+            else:
+                result = Result(name, unit.scope, FAIL if r.problems else PASS, r.problems,
+                                r.cached, time.time() - start, None)
+
+            if not result.cached:
+                timings.record(name, unit.scope, result.duration)
+            if fail_fast and result.status not in (PASS, SKIP):
+                stop = "cancelled after %s %s failed" % (name, unit.scope or '')
+            yield result
+    finally:
+        if use_alarm:
+            _cancel_alarm()
+            signal.signal(signal.SIGALRM, previous)
+        timings.save()
+        if cache is not None:
+            cache.prune()
+
+
+# ---------------------------------
+# Writers
+# ---------------------------------
+
+class ResultWriter(object):
+    """Base class for the writers, each result is flushed as it is written."""
+
+    def __init__(self, out):
+        self.out = out
+        self.count = 0
+        self.failed = 0
+        self.skipped = 0
+
+    def start(self):
+        pass
+
+    def write(self, r):
+        self.count += 1
+        if r.status == SKIP:
+            self.skipped += 1
+        elif r.status != PASS:
+            self.failed += 1
+        self.out.write(''.join(self.lines(r)))
+        self.out.flush()
+
+    def lines(self, r):
+        raise NotImplementedError()
+
+    def finish(self):
+        pass
+
+    def write_all(self, results):
+        """Write the results, returns the number of units which didn't pass."""
+        self.start()
+        for r in results:
+            self.write(r)
+        self.finish()
+        self.out.flush()
+        return self.failed
+
+
+def _name(r):
+    if r.scope:
+        return "%s %s" % (r.check, r.scope)
+    return r.check
+
+
+class TextWriter(ResultWriter):
+    def lines(self, r):
+        for problem in r.problems:
+            yield "%s: %s\n" % (r.check, problem)
+        if r.status in (ERROR, TIMEOUT):
+            yield "%s: %s %s\n" % (_name(r), r.status, r.message)
+
+    def finish(self):
+        self.out.write("# %d checks, %d failed, %d skipped\n" % (self.count, self.failed, self.skipped))
+
+
+class TAPWriter(ResultWriter):
+    def start(self):
+        self.out.write("TAP version 13\n")
+
+    def lines(self, r):
+        number = self.count
+        if r.status == SKIP:
+            yield "ok %d - %s # SKIP %s\n" % (number, _name(r), r.message)
+            return
+        yield "%s %d - %s\n" % ("ok" if r.status == PASS else "not ok", number, _name(r))
+        if r.status != PASS:
+            yield "  ---\n"
+            yield "  status: %s\n" % r.status
+            if r.message:
+                yield "  message: %s\n" % json.dumps(r.message)
+            if r.problems:
+                yield "  problems:\n"
+                for problem in r.problems:
+                    yield "    - %s\n" % json.dumps(problem)
+            yield "  duration_ms: %.1f\n" % (r.duration * 1000)
+            yield "  ...\n"
+
+    def finish(self):
+        self.out.write("1..%d\n" % self.count)
+
+
+class JUnitWriter(ResultWriter):
+    """JUnit XML, the testcases are written as they finish so the testsuite
+    has no counts (the readers count the testcases)."""
+
+    def start(self):
+        self.out.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        self.out.write('<testsuites>\n<testsuite name="circuit-unittests">\n')
+
+    def lines(self, r):
+        yield '  <testcase classname=%s name=%s time="%.6f"' % (
+            quoteattr(r.check), quoteattr(r.scope or r.check), r.duration)
+        if r.status == PASS:
+            yield '/>\n'
+            return
+        yield '>\n'
+        if r.status == SKIP:
+            yield '    <skipped message=%s/>\n' % quoteattr(r.message)
+        elif r.status == FAIL:
+            yield '    <failure message=%s>%s</failure>\n' % (
+                quoteattr("%d problems" % len(r.problems)), escape("\n".join(r.problems)))
+        else:
+            yield '    <error type=%s message=%s/>\n' % (quoteattr(r.status), quoteattr(r.message))
+        yield '  </testcase>\n'
+
+    def finish(self):
+        self.out.write('</testsuite>\n</testsuites>\n')
+
+
+class JSONLWriter(ResultWriter):
+    def lines(self, r):
+        record = r._asdict()
+        record['duration'] = round(r.duration, 6)
+        yield json.dumps(record, sort_keys=True) + "\n"
+
+
+WRITERS = {
+    'text': TextWriter,
+    'tap': TAPWriter,
+    'junit': JUnitWriter,
+    'jsonl': JSONLWriter,
+}
@@ -0,0 +1,446 @@
+#!/usr/bin/env python
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+import re
+
+from collections import namedtuple
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+
+def from_value(a):
+    try:
+        b = a.lower()
+        if b.endswith('d'):
+            b = b[:-1]
+        if b.endswith('r'):
+            b = b[:-1]
+            if not b:
+                b = "0"
+        if b == "240E":
+            return "unknown"
+        elif b.endswith('pf'):
+            return float(b[:-2]) * 1e-12
+        elif b.endswith('nf'):
+            return float(b[:-2]) * 1e-9
+        elif b.endswith('uf'):
+            return float(b[:-2]) * 1e-6
+        elif b.endswith('mf') or b.endswith('mh'):
+            return float(b[:-2]) * 1e-3
+        elif b.endswith('k'):
+            return float(b[:-1]) * 1e3
+        elif b.endswith('m'):
+            return float(b[:-1]) * 1e6
+        elif 'k' in b:
+            return float(b.replace('k', '.')) * 1e3
+        else:
+            return float(b)
+    except ValueError:
+        return a
+
+
+class ValueTable(object):
+    """One shared copy of each field name / value string (and of each parsed
+    value), so thousands of identical passives don't each have their own.
+
+    A table is made for each schematic build and goes away with it, a long
+    running process doesn't keep the values of every netlist it has loaded.
+    """
+
+    def __init__(self):
+        self.strings = {}
+        self.values = {}
+
+    def string(self, s):
+        return self.strings.setdefault(s, s)
+
+    def value(self, a):
+        """from_value() which only parses each distinct value once."""
+        try:
+            return self.values[a]
+        except KeyError:
+            value = self.values[a] = from_value(a)
+            return value
+
+
+PinBase = namedtuple("Pin", ["name", "description", "type"])
+class Pin(PinBase):
+    @staticmethod
+    def format_pin(pin):
+        try:
+            pin = int(pin)
+        except ValueError:
+            pass
+        try:
+            letter, digits = re.match('([A-Z]+)([0-9]+)', pin).groups()
+            pin = (letter, int(digits))
+        except Exception:
+            pass
+        return pin
+
+
+PartBase = namedtuple("Part", ["name", "pins"])
+class Part(PartBase):
+    def __new__(cls, name):
+        return PartBase.__new__(cls, name, pins={})
+
+    def add_pin(self, name, description, type):
+        p = Pin(Pin.format_pin(name), description, type)
+        assert p.name not in self.pins
+        self.pins[p.name] = p
+
+    def connected_pin(self, pin):
+        if self.name in ('R', 'C', 'SW_PUSH'):
+            if pin == 1:
+                return 2
+            elif pin == 2:
+                return 1
+            else:
+                raise IOError('Unknown pin! %s' % pin)
+        elif self.name == 'RES_NET4':
+            if pin == 1:
+                return 2
+            elif pin == 2:
+                return 1
+            elif pin == 3:
+                return 4
+            elif pin == 4:
+                return 3
+            elif pin == 5:
+                return 6
+            elif pin == 6:
+                return 5
+            elif pin == 7:
+                return 8
+            elif pin == 8:
+                return 7
+            else:
+                raise IOError('Unknown pin! %s' % pin)
+
+        elif self.name == 'IP4776CZ38':
+            if pin < 1 or pin > 38:
+                raise IOError('Unknown pin! %s' % pin)
+            # 19 == 20
+            # 18 == 21
+            # 17 == 22
+            if pin < 16 or pin > 23:
+                return
+
+            if pin < 20:
+                return 20 + (19 - pin)
+            else:
+                return 39 - pin
+        else:
+            return
+
+    def io_standard(self, pin):
+        desc = self.pins[pin].description
+
+        if self.name == "HDMI":
+            if desc.endswith('S') or desc == "DDC/CEC/HEC" or desc == "+5V":
+                return
+            # Data lines
+            elif desc.startswith('D'):
+                return 'TMDS_33'
+            # Clock line
+            elif desc.startswith('CLK'):
+                return 'TMDS_33'
+            elif desc in ("SCL", "SDA"):
+                return 'I2C'
+            elif desc in ('CEC', 'HPD'):
+                return 'LVCMOS33'
+            else:
+                assert False, "%s pin had description %s" % (pin, desc)
+
+        elif self.name == "DISPLAY_PORT":
+            if desc.startswith('ML_Lane'):
+                return 'LVDS_25'
+            elif desc in ("GND", "RETURN", "DP_PWR"):
+                return
+            elif desc in ('HPD', 'CONFIG1', 'CONFIG2'):
+                return 'LVCMOS33'
+            elif desc in ('AUXCH_N', 'AUXCH_P'):
+                return 'LVDS_33'
+            else:
+                assert False, "%s pin had description %s" % (pin, desc)
+
+        elif self.name == "MT41J128M16":
+            if desc in ('CK', 'CK_N', "LDQS", "LDQS_N", "UDQS", "UDQS_N"):
+                return 'DIFF_SSTL15_II'
+            elif desc.startswith('D') or desc.startswith('A') or desc.startswith('BA') or desc in ("CKE","UDM","LDM","RAS_N","RESET_N","ODT","CAS_N","WE_N"):
+                return 'SSTL15_II'
+            assert False, "%s pin had description %s" % (pin, desc)
+
+        elif self.name == "MICRO_SD":
+            return "SDIO"
+
+        elif self.name == "CY7C68013A_100AC":
+            return "LVCMOS33"
+
+        elif self.name == "RTL8211E-VL":
+            if desc in ("MDC", "MDIO"):
+                return "I2C"
+            return "LVCMOS33"
+
+        elif self.name == "TIMVIDEOS-PCIE-8X":
+            if desc in ("IDCLK", "IDDAT"):
+                return "I2C"
+            elif desc in ("~RST"):
+                return "LVCMOS33"
+            return "LVDS33"
+
+        elif self.name == "24AA02E48":
+            return "I2C"
+
+        elif self.name == "USB3340":
+            return "LVCMOS33"
+
+        return
+
+    def net_name(self, pin):
+        desc = self.pins[pin].description
+        if self.name == "HDMI":
+            data = re.match('D([0-9])([+-])', desc)
+            if data:
+                if data.group(2) == '+':
+                    return "hdmi_{0}_p["+data.group(1)+"]"
+                elif data.group(2) == '-':
+                    return "hdmi_{0}_n["+data.group(1)+"]"
+                else:
+                    assert False, (pin, desc, data.group(1), data.group(2))
+            elif desc == 'CLK+':
+                return "hdmi_{0}_clk_p"
+            elif desc == 'CLK-':
+                return "hdmi_{0}_clk_n"
+            elif desc in ('HPD', 'SCL', 'SDA', 'CEC'):
+                return "hdmi_{0}_"+desc.lower()
+            else:
+                assert False, (pin, desc)
+        elif self.name == "DISPLAY_PORT":
+            if desc.startswith('ML_Lane'):
+                return "dp_{0}_lnk_%s[%s]" % (desc[7].lower(), desc[8])
+            elif desc == "AUXCH_P":
+                return "dp_{0}_aux_p"
+            elif desc == "AUXCH_N":
+                return "dp_{0}_aux_n"
+            elif desc == "CONFIG1":
+                return "dp_{0}_config1"
+            elif desc == "CONFIG2":
+                return "dp_{0}_config2"
+            elif desc == "HPD":
+                return "dp_{0}_hpd"
+            else:
+                assert False, (pin, desc)
+
+        elif self.name == "MT41J128M16":
+            if desc in ('CK', 'CK_N', "LDQS", "LDQS_N", "UDQS", "UDQS_N") or desc in ("CKE","UDM","LDM","RAS_N","RESET_N","ODT","CAS_N","WE_N"):
+                return "mcb_dram_" + desc.lower()
+            elif desc[0] in ('D', 'A', 'B'):
+                match = re.match('([ADBQ]*)([0-9]*)', desc)
+                return "mcb_dram_{0}[{1}]".format(
+                    match.group(1).lower(), match.group(2))
+            else:
+                assert False, (pin, desc)
+
+        elif self.name == "TIMVIDEOS-PCIE-8X":
+            if desc.lower() == "~rst":
+                return "exp_rst"
+            elif desc in ("IDCLK", "IDDAT"):
+                return "exp_" + desc.lower()
+            elif desc.startswith("DIFF"):
+                desc = desc[5:]
+            return "exp_{0}_{1}".format(desc.lower()[:-1], desc.lower()[-1])
+
+        elif self.name == "CY7C68013A_100AC":
+            if desc == "INIT5#":
+                return "fx2_init5_n"
+
+            if desc in ("RXD0", "RXD1", "TXD0", "TXD1", "T0"):
+                return "fx2_" + desc.lower()
+
+            slash = desc.find('/')
+            if slash >= 0:
+                desc = desc[:slash]
+
+            if desc.endswith('#'):
+                desc = desc[:-1]+"_n"
+
+            if desc.startswith('*'):
+                desc = desc[1:]
+
+            match = re.match('([A-Za-z]*)([0-9]+)', desc)
+            if not match:
+                return "fx2_" + desc.lower()
+            else:
+                return "fx2_{0}[{1}]".format(match.group(1).lower(), match.group(2))
+
+        elif self.name == "RTL8211E-VL":
+            slash = desc.find('/')
+            if slash >= 0:
+                desc = desc[:slash]
+            match = re.match('([RTXD]*)([0-9]+)', desc)
+            if not match:
+                return "eth_" + desc.lower()
+            else:
+                return "eth_{0}[{1}]".format(match.group(1).lower(), match.group(2))
+
+        elif self.name == "MICRO_SD":
+            return "sdcard_" + desc.lower()
+
+        elif self.name == "24AA02E48":
+            return "eeprom_" + desc.lower()
+
+        elif self.name == "USB3340":
+            match = re.match('([A-Za-z]*)([0-9]+)', desc)
+            if not match:
+                return "utmi_" + desc.lower()
+            else:
+                return "utmi_{0}[{1}]".format(match.group(1).lower(), match.group(2))
+
+
+class Fields(Mapping):
+    """Component fields, decoded when first used.
+
+    Holds on to the raw value and a loader for the other fields. Only the value
+    is needed for most components (pull resistors), so it can be read without
+    decoding the rest of the fields. The strings and values are shared through
+    the ValueTable of the schematic build.
+    """
+
+    def __init__(self, value=None, loader=None, table=None):
+        if table is None:
+            table = ValueTable()
+        self._value = table.string(value) if value else None
+        self._loader = loader
+        self._table = table
+        self._fields = None
+
+    def _decode(self):
+        if self._fields is None:
+            table = self._table
+            fields = {}
+            if self._loader is not None:
+                for fieldname, value in self._loader():
+                    fields[table.string(fieldname.lower())] = table.string(value)
+            if self._value:
+                fields['value'] = table.value(self._value)
+            self._fields = fields
+            self._loader = None
+            self._table = None
+        return self._fields
+
+    def __getitem__(self, key):
+        if key == 'value' and self._fields is None and self._value:
+            return self._table.value(self._value)
+        return self._decode()[key]
+
+    def __contains__(self, key):
+        if key == 'value' and self._fields is None and self._value:
+            return True
+        return key in self._decode()
+
+    def __iter__(self):
+        return iter(self._decode())
+
+    def __len__(self):
+        return len(self._decode())
+
+    def __repr__(self):
+        return repr(self._decode())
+
+
+ComponentBase = namedtuple("Component", ['name', 'part', 'fields'])
+class Component(ComponentBase):
+    @property
+    def is_passive(self):
+        return self.part in ('C', 'R')
+
+    @property
+    def is_connector(self):
+        return self.name.startswith('J') and not self.name.startswith('JP')
+
+
+
+ConnectionBase = namedtuple("Connection", ['component', 'pin', 'via'])
+class Connection(ConnectionBase):
+    def __new__(cls, component, pin, via=None):
+        return ConnectionBase.__new__(cls, component=component, pin=pin, via=via)
+
+
+def is_power_net(name):
+    if "VCC" in name or "VDD" in name or "VTT" in name:
+        return "VCC"
+    elif "GND" in name:
+        return "GND"
+    else:
+        return None
+
+
+NetBase = namedtuple("Net", ['name', 'connections', 'pulls'])
+class Net(NetBase):
+    def __new__(cls, name):
+        return NetBase.__new__(cls, name=name, connections=set(), pulls=set())
+
+    def add_connection(self, c):
+        assert isinstance(c, Connection)
+        self.connections.add(c)
+
+    @property
+    def is_power(self):
+        return is_power_net(self.name)
+
+
+Pull = namedtuple('Pull', ['net', 'via', 'to'])
+
+
+class Schematic(object):
+    def __init__(self):
+        self.parts = {}
+        self.nets = {}
+        self.components = {}
+
+        self.components2nets = {}
+
+    def add_part(self, part):
+        assert isinstance(part, Part)
+        assert part.name not in self.parts
+        self.parts[part.name] = part
+
+    def add_component(self, comp):
+        assert isinstance(comp, Component)
+        assert comp.name not in self.components
+        assert comp.part in self.parts, comp.part
+        self.components[comp.name] = comp
+
+    def add_net(self, net):
+        assert isinstance(net, Net)
+        assert net.name not in self.nets
+        for c in net.connections:
+            assert c.component in self.components
+
+            c2net = self.components2nets.setdefault(c.component, {})
+            assert c.pin not in c2net, "Found pin %r already in schematic\n\nNew net - %r\n%r\n\nExisting - %r\n%r\n)" % (
+                c,
+                net.name, net,
+                c2net[c.pin], self.nets[c2net[c.pin]],
+                )
+            c2net[c.pin] = net.name
+
+        self.nets[net.name] = net
+
+    def net_for_pin(self, component, pin):
+        assert pin
+        netname = self.components2nets[component.name][pin]
+        return self.nets[netname]
+
+    def get_fpga(self):
+        try:
+            return self._fpga
+        except AttributeError:
+            for component in self.components.values():
+                if component.part.startswith('XC6SLX'):
+                    self._fpga = component.name
+                    return component.name
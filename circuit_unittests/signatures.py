@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+"""
+FPGA ball signatures, for checking a bitstream's pinout still fits another
+board (revision or variant).
+
+Each FPGA ball with constraints gets two 64 bit hashes (truncated sha1),
+
+  assignment   what is on the ball, the component pins and generated net names
+  signature    the assignment plus the IO standards and pull configuration
+
+Two boards are compared with one pass over their signatures, so it is cheap
+enough to do for every variant. The signatures are also stored in snapshots,
+so comparing snapshots doesn't need the pin constraints worked out again.
+"""
+
+import hashlib
+import struct
+import sys
+
+from collections import namedtuple
+
+from .constraints import pin_constraints, pin_key, pin_str, to_value
+from .schematic import Pin
+
+
+BallSignature = namedtuple("BallSignature", ['ball', 'assignment', 'signature', 'description'])
+
+Comparison = namedtuple("Comparison", ['same', 'changed', 'moved', 'swapped', 'added', 'removed'])
+
+_U64 = struct.Struct('<Q')
+
+
+def signature_hash(fields):
+    """sha1 of the fields, truncated to an unsigned 64 bit int."""
+    data = u'\x1f'.join(u'%s' % (f,) for f in fields).encode('utf-8')
+    return _U64.unpack(hashlib.sha1(data).digest()[:_U64.size])[0]
+
+
+def _ball_key(ball):
+    return pin_key(Pin.format_pin(ball))
+
+
+def ball_signatures(schematic):
+    """[BallSignature] for the balls with constraints, in ball order.
+
+    Snapshots normally have them stored, for anything else they are worked
+    out from the pin constraints.
+    """
+    stored = getattr(schematic, 'ball_signatures', None)
+    if stored is not None:
+        signatures = stored()
+        if signatures is not None:
+            return signatures
+
+    balls = {}
+    for c in pin_constraints(schematic):
+        balls.setdefault(c.loc, []).append(c)
+
+    signatures = []
+    for ball in sorted(balls, key=_ball_key):
+        constraints = sorted(balls[ball], key=lambda c: (c.component, pin_key(c.pin), c.net))
+        assigned = ["%s.%s %s" % (c.component, pin_str(c.pin), c.net) for c in constraints]
+        electrical = [
+            "%s %s" % (c.iostandard, " ".join(
+                "%s:%s:%s" % (p.strength, p.to, to_value(p.value)) for p in c.pulls))
+            for c in constraints]
+        assignment = signature_hash(assigned)
+        signatures.append(BallSignature(
+            ball, assignment, signature_hash([assignment] + electrical), ", ".join(assigned)))
+    return signatures
+
+
+def compare(old, new):
+    """Comparison of two lists of BallSignature.
+
+      same      number of balls with the same signature
+      changed   [(description, balls)] same assignment, different IO standard
+                or pulls
+      moved     [(description, old balls, new balls)]
+      swapped   [(ball a, ball b, description a, description b)] two balls
+                which have exchanged assignments
+      added     [(description, balls)] only on the new board
+      removed   [(description, balls)] only on the old board
+    """
+    old_signatures = dict((s.ball, s.signature) for s in old)
+    new_signatures = dict((s.ball, s.signature) for s in new)
+    same = sum(1 for s in new if old_signatures.get(s.ball) == s.signature)
+    if same == len(old) == len(new):
+        return Comparison(same, [], [], [], [], [])
+
+    def by_assignment(signatures):
+        assignments = {}
+        for s in signatures:
+            entry = assignments.setdefault(s.assignment, (s.description, []))
+            entry[1].append(s.ball)
+        return assignments
+
+    old_assignments = by_assignment(old)
+    new_assignments = by_assignment(new)
+
+    changed = []
+    moved = []
+    removed = []
+    for assignment, (description, old_balls) in old_assignments.items():
+        if assignment not in new_assignments:
+            removed.append((description, old_balls))
+            continue
+        new_balls = new_assignments[assignment][1]
+        if old_balls != new_balls:
+            moved.append((description, old_balls, new_balls))
+        elif any(old_signatures[b] != new_signatures[b] for b in old_balls):
+            changed.append((description, old_balls))
+
+    added = [
+        (description, balls)
+        for assignment, (description, balls) in new_assignments.items()
+        if assignment not in old_assignments]
+
+    # Pairs of single ball moves in opposite directions are swaps.
+    single = dict(
+        ((m[1][0], m[2][0]), m) for m in moved if len(m[1]) == 1 and len(m[2]) == 1)
+    swapped = []
+    for (a, b), m in sorted(single.items(), key=lambda i: (_ball_key(i[0][0]), _ball_key(i[0][1]))):
+        other = single.get((b, a))
+        if other is not None and _ball_key(a) < _ball_key(b):
+            swapped.append((a, b, m[0], other[0]))
+    swapped_balls = set(s[0] for s in swapped) | set(s[1] for s in swapped)
+    moved = [m for m in moved if not (len(m[1]) == 1 and m[1][0] in swapped_balls)]
+
+    def key(entry):
+        return [_ball_key(b) for b in entry[1]]
+
+    return Comparison(
+        same,
+        sorted(changed, key=key),
+        sorted(moved, key=key),
+        swapped,
+        sorted(added, key=key),
+        sorted(removed, key=key),
+        )
+
+
+def _balls(balls):
+    return ",".join(balls)
+
+
+def report(comparison, out=sys.stdout):
+    """Write the differences, returns the number of differences."""
+    c = comparison
+    for description, balls in c.changed:
+        out.write("changed  %-12s %s\n" % (_balls(balls), description))
+    for description, old_balls, new_balls in c.moved:
+        out.write("moved    %-12s %s (now %s)\n" % (_balls(old_balls), description, _balls(new_balls)))
+    for a, b, description_a, description_b in c.swapped:
+        out.write("swapped  %-12s %s <-> %s\n" % ("%s,%s" % (a, b), description_a, description_b))
+    for description, balls in c.added:
+        out.write("added    %-12s %s\n" % (_balls(balls), description))
+    for description, balls in c.removed:
+        out.write("removed  %-12s %s\n" % (_balls(balls), description))
+    count = len(c.changed) + len(c.moved) + len(c.swapped) + len(c.added) + len(c.removed)
+    out.write("# %d balls the same, %d differences\n" % (c.same, count))
+    return count
@@ -0,0 +1,525 @@
+#!/usr/bin/env python
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+"""
+Binary snapshot of a Schematic (normally the connectivity one).
+
+The snapshot is made to be mmap'ed, any number of processes can open the same
+file and share the pages. Nothing is decoded when the file is opened, the
+SnapshotSchematic view decodes parts, components and nets as they are looked
+up. Tables are stored sorted by name so lookups are a binary search.
+
+Layout (all little endian)
+
+  header      magic, version, section count
+  sections    (tag, offset, length) for each section
+  STRS        string table, count + offsets + utf-8 data
+  VALS        value table (pin names, field values), fixed size records
+  PRTS/PINS   parts and their pins
+  COMP/FLDS   components and their fields
+  NETS        nets (name, connections, pulls, flags)
+  NNAM        string ids of the names of nets (connectivity nets have a tuple
+              of names)
+  CONN        connections, CSR indexed by NETS
+  PULL        pulls, CSR indexed by NETS
+  C2NP/C2NE   component pin -> net, CSR indexed by COMP
+  SIGS        FPGA ball signatures (see signatures.py), in ball order, only for
+              boards with an FPGA whose pin constraints could be worked out
+"""
+
+import mmap
+import os
+import struct
+import tempfile
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+from .schematic import Pin, Part, Component, Connection, Net, Pull
+
+
+MAGIC = b'CUSNAP\0\0'
+VERSION = 2
+
+NONE = 0xffffffff
+
+_HEADER = struct.Struct('<8sII')
+_SECTION = struct.Struct('<4sQQ')
+_U32 = struct.Struct('<I')
+
+_VALUE = struct.Struct('<BxxxId')
+VALUE_NONE = 0
+VALUE_INT = 1
+VALUE_FLOAT = 2
+VALUE_STR = 3
+VALUE_PIN = 4
+
+_PART = struct.Struct('<III')
+_PIN = struct.Struct('<III')
+_COMP = struct.Struct('<IIII')
+_FIELD = struct.Struct('<II')
+_NET = struct.Struct('<IIIIIII')
+_CONN = struct.Struct('<IIII')
+_PULL = struct.Struct('<III')
+_C2N = struct.Struct('<II')
+_SIG = struct.Struct('<IQQI')
+
+NET_TUPLE_NAME = 1
+
+
+def _net_key(name):
+    if isinstance(name, tuple):
+        return '\0'.join(name)
+    return name
+
+
+# ---------------------------------
+# Writing
+# ---------------------------------
+
+class _Tables(object):
+    def __init__(self):
+        self.strings = []
+        self.string_ids = {}
+        self.values = []
+        self.value_ids = {}
+
+    def string(self, s):
+        if s is None:
+            return NONE
+        try:
+            return self.string_ids[s]
+        except KeyError:
+            self.string_ids[s] = len(self.strings)
+            self.strings.append(s)
+            return self.string_ids[s]
+
+    def value(self, v):
+        key = (type(v), v)
+        try:
+            return self.value_ids[key]
+        except KeyError:
+            pass
+        if v is None:
+            record = (VALUE_NONE, NONE, 0.0)
+        elif isinstance(v, bool) or isinstance(v, int):
+            record = (VALUE_INT, NONE, float(v))
+        elif isinstance(v, float):
+            record = (VALUE_FLOAT, NONE, v)
+        elif isinstance(v, tuple):
+            record = (VALUE_PIN, self.string(v[0]), float(v[1]))
+        else:
+            record = (VALUE_STR, self.string(v), 0.0)
+        self.value_ids[key] = len(self.values)
+        self.values.append(record)
+        return self.value_ids[key]
+
+    def string_section(self):
+        data = [s if isinstance(s, bytes) else s.encode('utf-8') for s in self.strings]
+        offsets = [0]
+        for d in data:
+            offsets.append(offsets[-1] + len(d))
+        return (_U32.pack(len(data)) +
+                struct.pack('<%dI' % len(offsets), *offsets) +
+                b''.join(data))
+
+
+def _pack(s, records):
+    return b''.join(s.pack(*r) for r in records)
+
+
+def write_snapshot(filename, schematic):
+    """Write the schematic to filename, atomically replacing any old file."""
+    t = _Tables()
+
+    part_names = sorted(schematic.parts)
+    parts = []
+    pins = []
+    for name in part_names:
+        part = schematic.parts[name]
+        part_pins = sorted(part.pins.values(), key=lambda p: t.value(p.name))
+        parts.append((t.string(name), len(pins), len(part_pins)))
+        for pin in part_pins:
+            pins.append((t.value(pin.name), t.string(pin.description), t.string(pin.type)))
+
+    comp_names = sorted(schematic.components)
+    comp_index = dict((name, i) for i, name in enumerate(comp_names))
+    comps = []
+    fields = []
+    for name in comp_names:
+        comp = schematic.components[name]
+        items = sorted(comp.fields.items())
+        comps.append((t.string(name), t.string(comp.part), len(fields), len(items)))
+        for key, value in items:
+            fields.append((t.string(key), t.value(value)))
+
+    net_names = sorted(schematic.nets, key=_net_key)
+    net_index = dict((name, i) for i, name in enumerate(net_names))
+    nets = []
+    names = []
+    conns = []
+    pulls = []
+    for name in net_names:
+        net = schematic.nets[name]
+        flags = 0
+        if isinstance(name, tuple):
+            flags |= NET_TUPLE_NAME
+            name_ids = [t.string(n) for n in name]
+        else:
+            name_ids = [t.string(name)]
+        net_conns = sorted(
+            (comp_index[c.component], t.value(c.pin),
+             t.string(c.via[0]) if c.via else NONE,
+             t.string(c.via[1]) if c.via else NONE)
+            for c in net.connections)
+        net_pulls = sorted(
+            (t.string(p.net), t.string(p.via), t.string(p.to)) for p in net.pulls)
+        nets.append((len(names), len(name_ids), len(conns), len(net_conns),
+                     len(pulls), len(net_pulls), flags))
+        names.extend(name_ids)
+        conns.extend(net_conns)
+        pulls.extend(net_pulls)
+
+    c2n_ptr = [0]
+    c2n = []
+    for name in comp_names:
+        pin_nets = schematic.components2nets.get(name, {})
+        c2n.extend(sorted(
+            (t.value(pin), net_index[netname]) for pin, netname in pin_nets.items()))
+        c2n_ptr.append(len(c2n))
+
+    sigs = None
+    if schematic.get_fpga():
+        from .signatures import ball_signatures
+        try:
+            sigs = [
+                (t.string(s.ball), s.assignment, s.signature, t.string(s.description))
+                for s in ball_signatures(schematic)]
+        except AssertionError:
+            # A board the pin constraints don't know yet, leave them to be
+            # worked out (and fail) when the snapshot is compared.
+            sigs = None
+
+    sections = [
+        (b'VALS', _U32.pack(len(t.values)) + _pack(_VALUE, t.values)),
+        (b'PRTS', _U32.pack(len(parts)) + _pack(_PART, parts)),
+        (b'PINS', _pack(_PIN, pins)),
+        (b'COMP', _U32.pack(len(comps)) + _pack(_COMP, comps)),
+        (b'FLDS', _pack(_FIELD, fields)),
+        (b'NETS', _U32.pack(len(nets)) + _pack(_NET, nets)),
+        (b'NNAM', struct.pack('<%dI' % len(names), *names)),
+        (b'CONN', _pack(_CONN, conns)),
+        (b'PULL', _pack(_PULL, pulls)),
+        (b'C2NP', struct.pack('<%dI' % len(c2n_ptr), *c2n_ptr)),
+        (b'C2NE', _pack(_C2N, c2n)),
+        ]
+    if sigs is not None:
+        sections.append((b'SIGS', _U32.pack(len(sigs)) + _pack(_SIG, sigs)))
+    # The string table is built last as the other sections add to it.
+    sections.insert(0, (b'STRS', t.string_section()))
+
+    offset = _HEADER.size + _SECTION.size * len(sections)
+    table = []
+    for tag, data in sections:
+        # Keep every section 8 byte aligned.
+        offset += -offset % 8
+        table.append((tag, offset, len(data)))
+        offset += len(data)
+
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmpname = tempfile.mkstemp(dir=directory, prefix='.snapshot-')
+    umask = os.umask(0)
+    os.umask(umask)
+    try:
+        os.chmod(tmpname, 0o666 & ~umask)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, len(sections)))
+            for entry in table:
+                f.write(_SECTION.pack(*entry))
+            for (tag, data), (_, offset, _) in zip(sections, table):
+                f.write(b'\0' * (offset - f.tell()))
+                f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        getattr(os, 'replace', os.rename)(tmpname, filename)
+    except Exception:
+        os.unlink(tmpname)
+        raise
+
+
+# ---------------------------------
+# Reading
+# ---------------------------------
+
+class _Section(object):
+    """Array of fixed size records in the mmap'ed file."""
+
+    def __init__(self, buf, offset, record, count=None, header=False):
+        self.buf = buf
+        self.record = record
+        if header:
+            count = _U32.unpack_from(buf, offset)[0]
+            offset += _U32.size
+        self.offset = offset
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        return self.record.unpack_from(self.buf, self.offset + i * self.record.size)
+
+
+class _Table(Mapping):
+    """Name sorted table which decodes (and then keeps) entries on lookup."""
+
+    def __init__(self, snapshot, section, decode):
+        self.snapshot = snapshot
+        self.section = section
+        self.decode = decode
+        self._cache = {}
+
+    def __len__(self):
+        return len(self.section)
+
+    def _name(self, i):
+        raise NotImplementedError()
+
+    def _key(self, name):
+        return name
+
+    def _find(self, name):
+        key = self._key(name)
+        lo, hi = 0, len(self.section)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(self._name(mid)) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self.section) and self._name(lo) == name:
+            return lo
+        raise KeyError(name)
+
+    def __getitem__(self, name):
+        try:
+            return self._cache[name]
+        except KeyError:
+            pass
+        except TypeError:
+            raise KeyError(name)
+        value = self._cache[name] = self.decode(self._find(name))
+        return value
+
+    def __iter__(self):
+        for i in range(len(self.section)):
+            yield self._name(i)
+
+
+class _NamedTable(_Table):
+    def _name(self, i):
+        return self.snapshot.string(self.section[i][0])
+
+
+class _NetTable(_Table):
+    def _name(self, i):
+        return self.snapshot._net_name(i)
+
+    def _key(self, name):
+        return _net_key(name)
+
+
+class _Components2Nets(Mapping):
+    """Component -> {pin: net}, like Schematic.components2nets only the
+    components which are on a net are in it."""
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self._len = None
+
+    def _has_pins(self, i):
+        return self.snapshot._c2n_ptr[i][0] != self.snapshot._c2n_ptr[i + 1][0]
+
+    def __len__(self):
+        if self._len is None:
+            self._len = sum(1 for i in range(len(self.snapshot._comps)) if self._has_pins(i))
+        return self._len
+
+    def __iter__(self):
+        components = self.snapshot.components
+        for i in range(len(self.snapshot._comps)):
+            if self._has_pins(i):
+                yield components._name(i)
+
+    def __getitem__(self, name):
+        try:
+            i = self.snapshot.components._find(name)
+        except TypeError:
+            raise KeyError(name)
+        if not self._has_pins(i):
+            raise KeyError(name)
+        return self.snapshot._component_nets(i)
+
+
+class SnapshotSchematic(object):
+    """Read only view of a snapshot, usable where a Schematic is expected."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            self.buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, count = _HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC:
+            raise IOError("%s is not a schematic snapshot" % filename)
+        if version != VERSION:
+            raise IOError("%s is snapshot version %s, expected %s" % (filename, version, VERSION))
+
+        sections = {}
+        for i in range(count):
+            tag, offset, length = _SECTION.unpack_from(self.buf, _HEADER.size + i * _SECTION.size)
+            sections[tag] = offset
+
+        self._strings_offset = sections[b'STRS']
+        self._string_count = _U32.unpack_from(self.buf, self._strings_offset)[0]
+        self._string_data = self._strings_offset + _U32.size * (self._string_count + 2)
+        self._string_cache = {}
+
+        self._values = _Section(self.buf, sections[b'VALS'], _VALUE, header=True)
+        self._parts = _Section(self.buf, sections[b'PRTS'], _PART, header=True)
+        self._pins = _Section(self.buf, sections[b'PINS'], _PIN)
+        self._comps = _Section(self.buf, sections[b'COMP'], _COMP, header=True)
+        self._fields = _Section(self.buf, sections[b'FLDS'], _FIELD)
+        self._nets = _Section(self.buf, sections[b'NETS'], _NET, header=True)
+        self._names = _Section(self.buf, sections[b'NNAM'], _U32)
+        self._conns = _Section(self.buf, sections[b'CONN'], _CONN)
+        self._pulls = _Section(self.buf, sections[b'PULL'], _PULL)
+        self._c2n_ptr = _Section(self.buf, sections[b'C2NP'], _U32)
+        self._c2n = _Section(self.buf, sections[b'C2NE'], _C2N)
+        self._sigs = None
+        if b'SIGS' in sections:
+            self._sigs = _Section(self.buf, sections[b'SIGS'], _SIG, header=True)
+
+        self.parts = _NamedTable(self, self._parts, self._part)
+        self.components = _NamedTable(self, self._comps, self._component)
+        self.nets = _NetTable(self, self._nets, self._net)
+        self.components2nets = _Components2Nets(self)
+
+    def close(self):
+        self.buf.close()
+
+    def records(self, tag):
+        """The _Section for the NETS, CONN, PULL or COMP records, for reading
+        them as arrays. count is None for CONN and PULL, the nets say how many
+        there are."""
+        return {
+            b'NETS': self._nets,
+            b'CONN': self._conns,
+            b'PULL': self._pulls,
+            b'COMP': self._comps,
+            }[tag]
+
+    def string(self, i):
+        if i == NONE:
+            return None
+        try:
+            return self._string_cache[i]
+        except KeyError:
+            pass
+        start, end = struct.unpack_from('<II', self.buf, self._strings_offset + _U32.size * (i + 1))
+        s = self.buf[self._string_data + start:self._string_data + end].decode('utf-8')
+        self._string_cache[i] = s
+        return s
+
+    def value(self, i):
+        kind, sid, num = self._values[i]
+        if kind == VALUE_INT:
+            return int(num)
+        elif kind == VALUE_FLOAT:
+            return num
+        elif kind == VALUE_STR:
+            return self.string(sid)
+        elif kind == VALUE_PIN:
+            return (self.string(sid), int(num))
+        return None
+
+    def _part(self, i):
+        name, start, count = self._parts[i]
+        part = Part(self.string(name))
+        for j in range(start, start + count):
+            pin, description, type = self._pins[j]
+            pin = self.value(pin)
+            part.pins[pin] = Pin(pin, self.string(description), self.string(type))
+        return part
+
+    def _component(self, i):
+        name, part, start, count = self._comps[i]
+        fields = {}
+        for j in range(start, start + count):
+            key, value = self._fields[j]
+            fields[self.string(key)] = self.value(value)
+        return Component(name=self.string(name), part=self.string(part), fields=fields)
+
+    def _net_name(self, i):
+        start, count, _, _, _, _, flags = self._nets[i]
+        names = tuple(self.string(self._names[j][0]) for j in range(start, start + count))
+        if flags & NET_TUPLE_NAME:
+            return names
+        return names[0]
+
+    def _net(self, i):
+        _, _, conn_start, conn_count, pull_start, pull_count, _ = self._nets[i]
+        net = Net(self._net_name(i))
+        for j in range(conn_start, conn_start + conn_count):
+            comp, pin, via_comp, via_net = self._conns[j]
+            via = None
+            if via_comp != NONE:
+                via = (self.string(via_comp), self.string(via_net))
+            net.connections.add(Connection(
+                self.string(self._comps[comp][0]), self.value(pin), via))
+        for j in range(pull_start, pull_start + pull_count):
+            pnet, via, to = self._pulls[j]
+            net.pulls.add(Pull(net=self.string(pnet), via=self.string(via), to=self.string(to)))
+        return net
+
+    def _component_nets(self, i):
+        start = self._c2n_ptr[i][0]
+        end = self._c2n_ptr[i + 1][0]
+        pins = {}
+        for j in range(start, end):
+            pin, net = self._c2n[j]
+            pins[self.value(pin)] = self._net_name(net)
+        return pins
+
+    def net_for_pin(self, component, pin):
+        assert pin
+        netname = self.components2nets[component.name][pin]
+        return self.nets[netname]
+
+    def ball_signatures(self):
+        """The stored [BallSignature], None if the snapshot has none."""
+        if self._sigs is None:
+            return None
+        from .signatures import BallSignature
+        signatures = []
+        for i in range(len(self._sigs)):
+            ball, assignment, signature, description = self._sigs[i]
+            signatures.append(BallSignature(
+                self.string(ball), assignment, signature, self.string(description)))
+        return signatures
+
+    def get_fpga(self):
+        try:
+            return self._fpga
+        except AttributeError:
+            for i in range(len(self._comps)):
+                name, part, _, _ = self._comps[i]
+                if self.string(part).startswith('XC6SLX'):
+                    self._fpga = self.string(name)
+                    return self._fpga
+
+
+def open_snapshot(filename):
+    return SnapshotSchematic(filename)
@@ -0,0 +1,23 @@
+#!/usr/bin/env python
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+from setuptools import setup
+
+
+setup(
+    name='circuit_unittests',
+    version='0.1',
+    description='"Unit tests" for KiCad schematics and PCBs',
+    license='Apache License 2.0',
+    packages=['circuit_unittests'],
+    install_requires=['kicad_netlist_reader'],
+    extras_require={
+        'matrix': ['numpy'],
+        'netload': ['numpy'],
+    },
+    entry_points={
+        'console_scripts': [
+            'circuit-unittests = circuit_unittests.cli:main',
+        ],
+    },
+)
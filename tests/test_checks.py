@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+import unittest
+
+from circuit_unittests import checks
+
+
+def _check(name):
+    for c in checks.CHECKS:
+        if c.name == name:
+            return c
+    raise KeyError(name)
+
+
+class CodeHashTest(unittest.TestCase):
+    def test_stable(self):
+        c = _check('hdmi-pairs')
+        self.assertEqual(checks.code_hash(c), checks.code_hash(c))
+
+    def test_constant_changes_hash(self):
+        c = _check('hdmi-pairs')
+        before = checks.code_hash(c)
+        pairs = checks.HDMI_PAIRS
+        checks.HDMI_PAIRS = pairs[:-1]
+        try:
+            self.assertNotEqual(checks.code_hash(c), before)
+        finally:
+            checks.HDMI_PAIRS = pairs
+        self.assertEqual(checks.code_hash(c), before)
+
+    def test_called_function_changes_hash(self):
+        c = _check('displayport-pairs')
+        before = checks.code_hash(c)
+        pattern = checks.FPGA_PAIR_RE
+        checks.FPGA_PAIR_RE = checks.re.compile(pattern.pattern + '|^X$')
+        try:
+            self.assertNotEqual(checks.code_hash(c), before)
+        finally:
+            checks.FPGA_PAIR_RE = pattern
+
+    def test_unused_constant_doesnt_change_hash(self):
+        c = _check('hdmi-pairs')
+        before = checks.code_hash(c)
+        pairs = checks.DISPLAYPORT_PAIRS
+        checks.DISPLAYPORT_PAIRS = pairs[:-1]
+        try:
+            self.assertEqual(checks.code_hash(c), before)
+        finally:
+            checks.DISPLAYPORT_PAIRS = pairs
+
+
+if __name__ == "__main__":
+    unittest.main()
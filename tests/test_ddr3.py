@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+import unittest
+
+from circuit_unittests import ddr3
+from circuit_unittests.schematic import Component, Connection, Net, Part, Schematic
+
+
+def _schematic(second_ball=False):
+    """DRAM A0 through a series resistor (R1) to the FPGA, terminated to VTT
+    (R2) on the DRAM side of the resistor. With second_ball A0 also goes
+    through R3 to another ball."""
+    s = Schematic()
+
+    fpga = Part('XC6SLX45T-FGG484')
+    fpga.add_pin('K2', 'IO_L47P_M3A0_3', 'BiDi')
+    fpga.add_pin('K3', 'IO_L47N_M3A1_3', 'BiDi')
+    s.add_part(fpga)
+    dram = Part('MT41J128M16')
+    dram.add_pin('N3', 'A0', 'input')
+    s.add_part(dram)
+    resistor = Part('R')
+    resistor.add_pin('1', '~', 'passive')
+    resistor.add_pin('2', '~', 'passive')
+    s.add_part(resistor)
+
+    s.add_component(Component('U10', 'XC6SLX45T-FGG484', {}))
+    s.add_component(Component('U1', 'MT41J128M16', {}))
+    s.add_component(Component('R1', 'R', {'value': 22.0}))
+    s.add_component(Component('R2', 'R', {'value': 49.9}))
+
+    nets = [
+        ('/DDR3/DRAM_A0', [('U1', ('N', 3)), ('R1', 1), ('R2', 1)]),
+        ('/DDR3/FPGA_A0', [('R1', 2), ('U10', ('K', 2))]),
+        ('VTTDDR', [('R2', 2)])]
+    if second_ball:
+        s.add_component(Component('R3', 'R', {'value': 22.0}))
+        nets[0][1].append(('R3', 1))
+        nets.append(('/DDR3/FPGA_A0_B', [('R3', 2), ('U10', ('K', 3))]))
+
+    for name, connections in nets:
+        net = Net(name)
+        for component, pin in connections:
+            net.add_connection(Connection(component, pin))
+        s.add_net(net)
+    return s
+
+
+class RoutesToFPGATest(unittest.TestCase):
+    def test_series_terminated(self):
+        s = _schematic()
+        routes = ddr3.routes_to_fpga(s, s.components['U1'], ('N', 3))
+        self.assertEqual(len(routes), 1)
+        route = routes[0]
+        self.assertEqual(route.ball, ('K', 2))
+        self.assertEqual(route.via, ('R1',))
+        self.assertEqual(route.nets, ('/DDR3/DRAM_A0', '/DDR3/FPGA_A0'))
+        self.assertEqual(route.pulls, (('R2', 'VTTDDR'),))
+
+    def test_several_balls_at_the_same_depth(self):
+        s = _schematic(second_ball=True)
+        routes = ddr3.routes_to_fpga(s, s.components['U1'], ('N', 3))
+        self.assertEqual(sorted(r.ball for r in routes), [('K', 2), ('K', 3)])
+
+        problems = ddr3.analyze(s)[0].problems
+        self.assertTrue(
+            any("connected to several FPGA balls K2, K3" in p for p in problems), problems)
+
+    def test_length_group_terminations(self):
+        groups = ddr3.length_groups(ddr3.analyze(_schematic()))
+        self.assertEqual(groups['U1_address']['A0']['terminations'], [['R2', 'VTTDDR']])
+
+
+if __name__ == "__main__":
+    unittest.main()
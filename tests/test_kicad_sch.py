@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+import os
+import unittest
+
+from circuit_unittests.netlist import load_schematic
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'hierarchy')
+
+try:
+    import kicad_netlist_reader
+except ImportError:
+    kicad_netlist_reader = None
+
+
+def _nets(schematic):
+    return dict(
+        (name, sorted((c.component, c.pin) for c in net.connections))
+        for name, net in schematic.nets.items())
+
+
+class LoadSchematicTest(unittest.TestCase):
+    """top.sch has J1 and R1 on the root sheet, R2 on the "amp" sheet, and the
+    two units of U1 one on each."""
+
+    def setUp(self):
+        self.schematic = load_schematic(os.path.join(FIXTURE, 'top.sch'), jobs=1)
+
+    def test_net_names(self):
+        nets = _nets(self.schematic)
+        # Local label on the root sheet.
+        self.assertEqual(nets['/IN_RAW'], [('J1', 1), ('R1', 1)])
+        # Sheet pin to a hierarchical label, which wins over the root
+        # sheet's local label on the same net.
+        self.assertEqual(nets['/amp/IN'], [('R1', 2), ('U1', 1)])
+        # Local label on the sub sheet.
+        self.assertEqual(nets['/amp/LED'], [('R2', 2)])
+        # Global label on both sheets.
+        self.assertEqual(nets['BUF_OUT'], [('J1', 2), ('R2', 1), ('U1', 2)])
+        # Power symbols and the hidden power pins of U1.
+        self.assertEqual(nets['GND'], [('J1', 3), ('U1', 6)])
+        self.assertEqual(nets['+3V3'], [('U1', 3)])
+        self.assertEqual(nets['VCC'], [('U1', 5)])
+        # Unconnected pin of the second unit.
+        self.assertEqual(nets['Net-(U1-Pad4)'], [('U1', 4)])
+        self.assertEqual(len(nets), 8)
+
+    def test_components(self):
+        self.assertEqual(sorted(self.schematic.components), ['J1', 'R1', 'R2', 'U1'])
+        self.assertEqual(sorted(self.schematic.parts['DUAL_BUF'].pins), [1, 2, 3, 4, 5, 6])
+
+    @unittest.skipIf(kicad_netlist_reader is None, "kicad_netlist_reader isn't installed")
+    def test_matches_export(self):
+        exported = load_schematic(os.path.join(FIXTURE, 'top.xml'))
+        self.assertEqual(_nets(self.schematic), _nets(exported))
+        self.assertEqual(sorted(self.schematic.components), sorted(exported.components))
+        for name, part in exported.parts.items():
+            self.assertEqual(self.schematic.parts[name], part)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+import random
+import shutil
+import tempfile
+import unittest
+
+from circuit_unittests import outofcore
+
+
+class ExternalSorterTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        rng = random.Random(1)
+        self.records = [(rng.randrange(1000), i) for i in range(20000)]
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def _sort(self, run_size):
+        sorter = outofcore.ExternalSorter(self.workdir, run_size, key=lambda r: r[0])
+        for r in self.records:
+            sorter.add(r)
+        result = list(sorter)
+        sorter.close()
+        return sorter, result
+
+    def test_sorted_and_stable(self):
+        expected = sorted(self.records, key=lambda r: r[0])
+        for run_size in (16, 1000, 100000):
+            _, result = self._sort(run_size)
+            self.assertEqual(result, expected)
+
+    def test_small_budget_merges_more(self):
+        passes = []
+        for run_size in (64, 1024, 100000):
+            sorter, _ = self._sort(run_size)
+            # The batches of the runs merged at once fit in the budget.
+            self.assertLessEqual(sorter.batch_size * sorter.fanin, run_size)
+            passes.append(sorter.merge_passes)
+        self.assertGreater(passes[0], passes[1])
+        self.assertEqual(passes[2], 0)
+
+    def test_run_size(self):
+        self.assertEqual(outofcore.run_size(0), 2)
+        self.assertLess(outofcore.run_size(0.01), outofcore.run_size(1))
+
+
+if __name__ == "__main__":
+    unittest.main()
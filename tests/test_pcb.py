@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+import os
+import sys
+import unittest
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+from circuit_unittests import cli, pcb
+from circuit_unittests.pcb import PCB, Point, Segment, SegmentGrid, segment_distance
+
+# The HDMI pair runs together, the USB pair doesn't, and SDA / SCL are too
+# close on F.Cu (SCL also runs under SDA on B.Cu).
+BOARD = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'pairs.kicad_pcb')
+
+
+class SegmentDistanceTest(unittest.TestCase):
+    def test_parallel(self):
+        self.assertAlmostEqual(segment_distance(Point(0, 0), Point(10, 0), Point(0, 1), Point(10, 1)), 1.0)
+
+    def test_crossing(self):
+        self.assertEqual(segment_distance(Point(0, 0), Point(10, 10), Point(0, 10), Point(10, 0)), 0.0)
+
+    def test_touching(self):
+        self.assertEqual(segment_distance(Point(0, 0), Point(10, 0), Point(5, 0), Point(5, 5)), 0.0)
+
+    def test_collinear_apart(self):
+        self.assertAlmostEqual(segment_distance(Point(0, 0), Point(1, 0), Point(3, 0), Point(4, 0)), 2.0)
+
+    def test_end_to_side(self):
+        self.assertAlmostEqual(segment_distance(Point(0, 0), Point(0, 10), Point(3, 5), Point(8, 9)), 3.0)
+
+    def test_point(self):
+        self.assertAlmostEqual(segment_distance(Point(5, 3), Point(5, 3), Point(0, 0), Point(10, 0)), 3.0)
+
+    def test_track_edges(self):
+        a = Segment(Point(0, 0), Point(10, 0), 0.2, 'F.Cu', 'A')
+        b = Segment(Point(0, 1), Point(10, 1), 0.4, 'F.Cu', 'B')
+        self.assertAlmostEqual(a.distance(b), 0.7)
+
+
+class SegmentGridTest(unittest.TestCase):
+    def setUp(self):
+        self.pcb = PCB.load(BOARD)
+
+    def brute_force(self, segment, distance):
+        return set(
+            i for i, other in enumerate(self.pcb.segments)
+            if other is not segment and other.layer == segment.layer
+            and segment.distance(other) <= distance)
+
+    def test_near(self):
+        grid = SegmentGrid(self.pcb.segments)
+        sda = self.pcb.net_segments('/SDA')[0]
+        near = set(grid.near(self.pcb.segments[sda], 0.2))
+        self.assertEqual([self.pcb.segments[i].net for i in near], ['/SCL'])
+        self.assertEqual(self.pcb.segments[list(near)[0]].layer, 'F.Cu')
+
+    def test_near_matches_brute_force(self):
+        for cell_size in (None, 0.3, 2.0, 50.0):
+            grid = SegmentGrid(self.pcb.segments, cell_size)
+            for segment in self.pcb.segments:
+                for distance in (0.0, 0.2, 1.0, 3.0, 20.0):
+                    self.assertEqual(
+                        set(grid.near(segment, distance)), self.brute_force(segment, distance),
+                        (cell_size, segment, distance))
+
+
+class CoupledPairsTest(unittest.TestCase):
+    def setUp(self):
+        self.pcb = PCB.load(BOARD)
+
+    def test_coupled_pairs(self):
+        pairs = dict(((p.p, p.n), p) for p in pcb.coupled_pairs(self.pcb))
+        self.assertEqual(sorted(pairs), [('/HDMI_D0_P', '/HDMI_D0_N'), ('/USB_P', '/USB_N')])
+
+        hdmi = pairs[('/HDMI_D0_P', '/HDMI_D0_N')]
+        self.assertAlmostEqual(hdmi.length, 20.0)
+        self.assertAlmostEqual(hdmi.coupled, 20.0)
+        self.assertAlmostEqual(hdmi.ratio, 1.0)
+
+        usb = pairs[('/USB_P', '/USB_N')]
+        self.assertAlmostEqual(usb.length, 20.0)
+        self.assertEqual(usb.coupled, 0.0)
+
+    def test_gap(self):
+        # The USB pair is 2.75mm apart edge to edge.
+        pairs = dict(((p.p, p.n), p) for p in pcb.coupled_pairs(self.pcb, gap=3.0))
+        self.assertAlmostEqual(pairs[('/USB_P', '/USB_N')].ratio, 1.0)
+
+    def test_spacing_violations(self):
+        violations = pcb.spacing_violations(self.pcb)
+        self.assertEqual(len(violations), 1)
+        v = violations[0]
+        self.assertEqual(
+            sorted([self.pcb.segments[v.a].net, self.pcb.segments[v.b].net]), ['/SCL', '/SDA'])
+        self.assertEqual(v.layer, 'F.Cu')
+        self.assertAlmostEqual(v.distance, 0.1)
+        self.assertAlmostEqual(v.required, 0.2)
+
+    def test_report(self):
+        out = StringIO()
+        self.assertEqual(pcb.report(self.pcb, out), 2)
+        self.assertIn("/USB_P / /USB_N: 0.0% of 20.00mm coupled  <--", out.getvalue())
+
+    def test_cli_fails(self):
+        stdout, sys.stdout = sys.stdout, StringIO()
+        try:
+            self.assertEqual(cli.main(['pcb', BOARD]), 1)
+        finally:
+            sys.stdout = stdout
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,22 @@
+#!/usr/bin/env python
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+import unittest
+
+from circuit_unittests.schematic import Part
+
+
+class ConnectedPinTest(unittest.TestCase):
+    def test_ip4776cz38(self):
+        part = Part('IP4776CZ38')
+        # Pins 16 to 23 pass straight through the ESD protection.
+        for a, b in [(16, 23), (17, 22), (18, 21), (19, 20)]:
+            self.assertEqual(part.connected_pin(a), b)
+            self.assertEqual(part.connected_pin(b), a)
+        self.assertIsNone(part.connected_pin(1))
+        self.assertIsNone(part.connected_pin(38))
+        self.assertRaises(IOError, part.connected_pin, 39)
+
+
+if __name__ == "__main__":
+    unittest.main()
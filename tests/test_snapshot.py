@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# vim: set ts=4 sw=4 et sts=4 ai:
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from circuit_unittests import snapshot
+from circuit_unittests.connectivity import build_connectivity
+from circuit_unittests.schematic import Component, Connection, Net, Part, Schematic
+
+NETLIST = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'HDMI2USB.xml')
+
+try:
+    import kicad_netlist_reader
+except ImportError:
+    kicad_netlist_reader = None
+
+
+def _schematic():
+    """U1 through R1 to J1, pulled up by R2, and a mounting hole (MH1) which
+    isn't on any net."""
+    s = Schematic()
+
+    for name, pins in [
+            ('R', [('1', '~', 'passive'), ('2', '~', 'passive')]),
+            ('CONN_2', [('1', 'P1', 'passive'), ('2', 'P2', 'passive')]),
+            ('TEST_IC', [('A1', 'IN', 'input'), ('B2', 'OUT', 'output')]),
+            ('HOLE', [])]:
+        part = Part(name)
+        for pin in pins:
+            part.add_pin(*pin)
+        s.add_part(part)
+
+    s.add_component(Component('U1', 'TEST_IC', {'value': 'TEST_IC'}))
+    s.add_component(Component('R1', 'R', {'value': 22.0}))
+    s.add_component(Component('R2', 'R', {'value': 4700.0, 'footprint': 'R_0402'}))
+    s.add_component(Component('J1', 'CONN_2', {}))
+    s.add_component(Component('MH1', 'HOLE', {}))
+
+    for name, connections in [
+            ('/U1_OUT', [('U1', ('B', 2)), ('R1', 1)]),
+            ('/J1_IN', [('R1', 2), ('J1', 1), ('R2', 1)]),
+            ('/U1_IN', [('U1', ('A', 1)), ('J1', 2)]),
+            ('VCC3V3', [('R2', 2)])]:
+        net = Net(name)
+        for component, pin in connections:
+            net.add_connection(Connection(component, pin))
+        s.add_net(net)
+    return s
+
+
+class SnapshotRoundTripTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def assertSameSchematic(self, expected, snap):
+        self.assertEqual(sorted(snap.parts), sorted(expected.parts))
+        for name, part in expected.parts.items():
+            self.assertEqual(snap.parts[name], part)
+
+        self.assertEqual(sorted(snap.components), sorted(expected.components))
+        for name, component in expected.components.items():
+            got = snap.components[name]
+            self.assertEqual((got.name, got.part, dict(got.fields)),
+                             (component.name, component.part, dict(component.fields)))
+
+        self.assertEqual(sorted(snap.nets), sorted(expected.nets))
+        for name, net in expected.nets.items():
+            self.assertEqual(snap.nets[name], net)
+
+        self.assertEqual(len(snap.components2nets), len(expected.components2nets))
+        self.assertEqual(sorted(snap.components2nets), sorted(expected.components2nets))
+        for name, pins in expected.components2nets.items():
+            self.assertEqual(snap.components2nets[name], pins)
+
+    def round_trip(self, connectivity):
+        filename = os.path.join(self.directory, 'board.snap')
+        snapshot.write_snapshot(filename, connectivity)
+        snap = snapshot.SnapshotSchematic(filename)
+        self.addCleanup(snap.close)
+        return snap
+
+    def test_round_trip(self):
+        connectivity = build_connectivity(_schematic())
+        self.assertSameSchematic(connectivity, self.round_trip(connectivity))
+
+    def test_components_without_nets(self):
+        snap = self.round_trip(build_connectivity(_schematic()))
+        self.assertIn('MH1', snap.components)
+        self.assertNotIn('MH1', snap.components2nets)
+        self.assertRaises(KeyError, lambda: snap.components2nets['MH1'])
+        self.assertRaises(KeyError, lambda: snap.components2nets['U99'])
+
+    @unittest.skipIf(kicad_netlist_reader is None, "kicad_netlist_reader isn't installed")
+    @unittest.skipIf(sys.version_info[0] < 3, "the netlist strings are utf-8 bytes on Python 2")
+    def test_round_trip_netlist(self):
+        from circuit_unittests.netlist import load_schematic
+        connectivity = build_connectivity(load_schematic(NETLIST))
+        self.assertSameSchematic(connectivity, self.round_trip(connectivity))
+
+
+if __name__ == "__main__":
+    unittest.main()